@@ -1,3 +1,5 @@
-
 from .ibcao import *
+from .sampler import *
+from .tiled import *
 
+from .weights import *
@@ -6,11 +6,99 @@
 # IBCAO interface
 
 import  os
-from    pyproj import Proj, Geod
-import  scipy as sc, scipy.io
+import  time
+import  threading
+from    collections import OrderedDict, namedtuple
 import  numpy as np
-import  matplotlib.cm as cm
-import  cartopy.crs as ccrs
+
+# matplotlib, cartopy, pyproj and scipy.io are imported on first use, so that
+# the depth functions can be used without loading the plotting libraries.
+
+CacheInfo = namedtuple ('CacheInfo', ['hits', 'misses', 'evictions', 'build_time', 'currsize', 'nbytes', 'maxbytes'])
+Profile   = namedtuple ('Profile', ['offsets', 'lon', 'lat', 'distance', 'depth'])
+
+class _LRUCache:
+  """
+  A least recently used cache bounded by the total size (in bytes) of the
+  items it holds. The most recently added item is always kept, even if it is
+  larger than the budget by itself.
+
+  The cache may be used from several threads, items are built outside the
+  lock so that different keys can be built concurrently.
+  """
+
+  def __init__ (self, maxbytes):
+    self.maxbytes = maxbytes
+    self._lock    = threading.Lock ()
+    self.clear ()
+
+  def clear (self):
+    """
+    Drop all items and reset the statistics.
+    """
+    with self._lock:
+      self.nbytes     = 0
+      self.hits       = 0
+      self.misses     = 0
+      self.evictions  = 0
+      self.build_time = 0.
+      self._items     = OrderedDict ()
+
+  def info (self):
+    with self._lock:
+      return CacheInfo (self.hits, self.misses, self.evictions, self.build_time,
+                        len(self._items), self.nbytes, self.maxbytes)
+
+  def get (self, key, build, size):
+    """
+    Returns the item for `key`, calling `build ()` to create it if it is not
+    cached. `size (item)` gives the size of the item in bytes.
+    """
+    with self._lock:
+      if key in self._items:
+        self.hits += 1
+        self._items.move_to_end (key)
+        return self._items[key][0]
+
+      self.misses += 1
+
+    t0 = time.perf_counter ()
+    v = build ()
+    dt = time.perf_counter () - t0
+    n = size (v)
+
+    with self._lock:
+      self.build_time += dt
+
+      # built by another thread in the meantime
+      if key in self._items:
+        return self._items[key][0]
+
+      while self._items and self.nbytes + n > self.maxbytes:
+        _, (_, nn) = self._items.popitem (last = False)
+        self.nbytes -= nn
+        self.evictions += 1
+
+      self._items[key] = (v, n)
+      self.nbytes += n
+
+    return v
+
+  def __len__ (self):
+    return len (self._items)
+
+def _sibling (name):
+  """
+  Returns the module `name` next to this one, also when this module is
+  imported on its own rather than from the package (as by
+  `tests/runtests.sh` and the demo below).
+  """
+  import importlib
+
+  if __package__:
+    return importlib.import_module ('.' + name, __package__)
+
+  return importlib.import_module (name)
 
 class IBCAO:
   """
@@ -78,13 +166,27 @@ class IBCAO:
 1500	170	170	170	5000	200	200	200
 """
 
-  def __init__ (self, ibcao_grd_file = _ibcao_grid):
+  def __init__ (self, ibcao_grd_file = _ibcao_grid, persist = False, cache_dir = None, cache_size = 256 * 1024**2, native = False):
+    """
+    Args:
+      ibcao_grd_file: path to the IBCAO grd file.
+      persist:        store derived data (e.g. spline coefficients) in `.npy`
+                      sidecar files so that later instances can memory-map
+                      them instead of recomputing (default False).
+      cache_dir:      directory for sidecar files and tiles (default: next to
+                      the grd file).
+      cache_size:     memory budget in bytes for the tile interpolators of
+                      `interp_depth` (default 256 MB).
+      native:         use a native-endian copy of `z` (see `native_z`),
+                      created in `cache_dir` on first use (default False).
+    """
     self.ibcao_grid = ibcao_grd_file
     if not os.path.exists (self.ibcao_grid):
       print ('IBCAO grid could not be found in:' + self.ibcao_grid + ' , download from: http://www.ngdc.noaa.gov/mgg/bathymetry/arctic/grids/version3_0/IBCAO_V3_500m_RR.grd')
       raise RuntimeError ('IBCAO grid not found')
 
 
+    import scipy.io
     ibcao_nc = scipy.io.netcdf_file (self.ibcao_grid)
     self.ibcao_nc = ibcao_nc
 
@@ -94,11 +196,22 @@ class IBCAO:
 
     # load ibcao projection details
     self._z     = ibcao_nc.variables['z']
+    self._native = None
+
+    # shared memory with the grid and coefficients (see `share`)
+    self._shm       = None
+    self._shm_owner = False
+    self._shared    = {}
     self.ups_x  = ibcao_nc.variables['x']
     self.ups_y  = ibcao_nc.variables['y']
     self.dim    = (self.ups_x.shape[0], self.ups_y.shape[0])
     print ("ibcao read, shape:", self.dim)
 
+    # window (r0, r1, c0, c1) of the grid covered by this instance, the full
+    # grid unless this is a subset (see `subset`).
+    self._window = (0, self.dim[1], 0, self.dim[0])
+    self._parent = None
+
     # source: IBCAO_V3_README.txt
     self.extent     = 2904000  # from README, northing and easting
     self.resolution = 500 # meters
@@ -106,17 +219,34 @@ class IBCAO:
     self.projection_s   = 'stere'
     self.datum          = 'WGS84'
     self.ellps          = 'WGS84'
+    self.semi_major     = 6378137.0           # m, WGS84
+    self.flattening     = 1 / 298.257223563   # WGS84
     self.vertical_datum = 'mean sea level'
     self.true_scale     = 75.0  # deg N
     self.scale_factor   = 0.982966757777337
     self.origin_lat     = 90  # deg N
     self.origin_lon     = 0   # deg
 
-    self.projection = self.get_cartopy ()
+    # cartopy instances, set up on first use
+    self._g   = None
+    self._ups = None
+
+    # derived data, sidecar files are only written when persist is set
+    self.persist   = persist
+    self.cache_dir = cache_dir if cache_dir is not None else os.path.dirname (os.path.abspath (self.ibcao_grid))
+    self._coeffs   = {}
+    self._splines  = _LRUCache (cache_size)
+    self._overviews = {}
+    self._lonlat   = {}
+    self._isobaths = {}
+    self._fields   = {}
+    self._lock     = threading.RLock ()
+
+    # tiled copy of the grid (see `convert`), preferred for region reads
+    self._tiles    = self._load_tiles ()
 
-    # store for short-cut
-    self.g = ccrs.Geodetic ()
-    self._ups = self.get_cartopy ()
+    if native:
+      self._native = self.native_z ()
 
     # don't close when mmapped: scipy#3630
     #self.ibcao_nc.close ()
@@ -126,9 +256,302 @@ class IBCAO:
     Closes the map file. The map is memorymapped, so this will cause a warning unless all references to the map have been removed.
     """
     # make sure you don't close in case mmap is used elsewhere
+    self.clear_cache ()
+    if self._parent is not None:
+      # the map is owned by the full instance
+      return
+
     print ("ibcao: closing map.")
+    self._close_shared ()
     self.ibcao_nc.close ()
 
+  ## subsets
+  def subset (self, lon = None, lat = None, x = None, y = None):
+    """
+    Returns a view of the region of interest given by a longitude and
+    latitude box, or a UPS box.
+
+    The view has the same interface as `IBCAO` (e.g. `map_depth`,
+    `interp_depth`, `overview`, `template`, `grid`), but `x`, `y`, `z`,
+    `xlim` and `ylim` only cover the window of the grid around the region,
+    and indices are relative to the window. The arrays are slices of the
+    memory-mapped grid, and derived data (spline coefficients, overviews and
+    interpolators) are computed for the window only and kept by the view, so
+    memory use and setup time scale with the size of the region. Splines are
+    fitted with a margin of the grid around the window, so that depths match
+    those of the full grid up to the edge of the window. Points outside the
+    window are nan.
+
+    The view uses the map file of this instance, closing the view only clears
+    its caches.
+
+    Args:
+      lon: (lon0, lon1) longitude range in degrees, east from `lon0` to
+           `lon1` (across the antimeridian if `lon1` < `lon0`)
+      lat: (lat0, lat1) latitude range in degrees
+      x: (x0, x1) UPS range in meters, instead of `lon` and `lat`
+      y: (y0, y1) UPS range in meters
+
+    Returns:
+      IBCAO: view of the region.
+
+    >>> i = IBCAO ()
+    >>> fram = i.subset (lon = (-20, 15), lat = (76, 82))
+    >>> d = fram.map_depth (x, y)
+    """
+    if lon is not None or lat is not None:
+      if x is not None or y is not None:
+        raise ValueError ("give either lon and lat, or x and y")
+
+      lon0, lon1 = lon if lon is not None else (-180., 180.)
+      lat0, lat1 = sorted (lat if lat is not None else (-90., 90.))
+      if lon1 <= lon0:
+        lon1 += 360.
+
+      # outline of the box, the pole is the center of the projection
+      n  = 256
+      bl = np.concatenate ((np.linspace (lon0, lon1, n), np.full (n, lon1),
+                            np.linspace (lon1, lon0, n), np.full (n, lon0)))
+      bp = np.concatenate ((np.full (n, lat0), np.linspace (lat0, lat1, n),
+                            np.full (n, lat1), np.linspace (lat1, lat0, n)))
+      bx, by = self.lonlat_to_xy (bl, bp)
+      if lat1 >= 90.:
+        bx = np.append (bx, 0.)
+        by = np.append (by, 0.)
+
+      x = (bx.min (), bx.max ())
+      y = (by.min (), by.max ())
+
+    if x is None or y is None:
+      raise ValueError ("give lon and lat, or x and y")
+
+    x0, x1 = sorted (x)
+    y0, y1 = sorted (y)
+
+    # window in full grid indices, within the window of this instance
+    res = self.resolution
+    R0, R1, C0, C1 = self._window
+    r0 = max (R0, int (np.floor ((y0 + self.extent) / res)))
+    r1 = min (R1, int (np.ceil ((y1 + self.extent) / res)) + 1)
+    c0 = max (C0, int (np.floor ((x0 + self.extent) / res)))
+    c1 = min (C1, int (np.ceil ((x1 + self.extent) / res)) + 1)
+
+    if r1 <= r0 or c1 <= c0:
+      raise ValueError ("region does not overlap the grid")
+
+    return self._view ((r0, r1, c0, c1))
+
+  def _view (self, window):
+    """
+    Returns a view (see `subset`) of the `window` (r0, r1, c0, c1) in full
+    grid indices.
+    """
+    import copy
+
+    r0, r1, c0, c1 = window
+
+    v = copy.copy (self)
+    v._window = (r0, r1, c0, c1)
+    v._parent = self if self._parent is None else self._parent
+    v.dim     = (c1 - c0, r1 - r0)
+
+    # derived data is computed for the window
+    v._coeffs    = {}
+    v._splines   = _LRUCache (self._splines.maxbytes)
+    v._overviews = {}
+    v._lonlat    = {}
+    v._isobaths  = {}
+    v._fields    = {}
+    v._lock      = threading.RLock ()
+    v._shm       = None
+    v._shm_owner = False
+    v._shared    = {}
+
+    return v
+
+  @property
+  def _x0 (self):
+    """
+    `x` of the first column of the window.
+    """
+    return -self.extent + self._window[2] * self.resolution
+
+  @property
+  def _y0 (self):
+    """
+    `y` of the first row of the window.
+    """
+    return -self.extent + self._window[0] * self.resolution
+
+  ## shared memory
+  #
+  # the block starts with a json header (padded to `_shm_header` bytes)
+  # describing the arrays, followed by the arrays aligned to 64 bytes.
+  _shm_header = 4096
+
+  @property
+  def shared_name (self):
+    """
+    Name of the shared memory block used by this instance, or `None`.
+    """
+    return self._shm.name if self._shm is not None else None
+
+  def share (self, orders = ()):
+    """
+    Place the grid (as native-endian float32) and the spline coefficients of
+    `map_depth` in a `multiprocessing.shared_memory` block, and use it from
+    this instance. Other processes on the same host can use the same physical
+    copy through `IBCAO.attach`.
+
+    The block is released by `close`, the instance that created it also
+    removes it. Processes that are attached keep their mapping until they
+    close.
+
+    Args:
+      orders: spline orders to compute coefficients for and share, in
+              addition to those already computed (e.g. `(3,)`).
+
+    Returns:
+      name of the shared memory block, to be passed to `attach`.
+    """
+    import json
+    from multiprocessing import shared_memory
+
+    if self._shm is not None:
+      return self._shm.name
+
+    if self._parent is not None:
+      raise ValueError ("share the full grid, subsets use the shared grid of their full instance")
+
+    for o in orders:
+      self.coefficients (o)
+
+    arrays = { 'z' : (self.z, np.float32) }
+    for (order, level), c in self._coeffs.items ():
+      if level == 0 and order > 1:
+        arrays['spline%d' % order] = (c, np.float64)
+
+    header = {}
+    off = self._shm_header
+    for k, (a, dtype) in arrays.items ():
+      header[k] = { 'offset' : off, 'shape' : list (a.shape), 'dtype' : np.dtype (dtype).str }
+      off += -(-a.size * np.dtype (dtype).itemsize // 64) * 64
+
+    print ("ibcao: copying grid to shared memory (%d MB).." % (off // 1024**2))
+    shm = shared_memory.SharedMemory (create = True, size = off)
+    h = json.dumps (header).encode ()
+    shm.buf[:len(h)] = h
+
+    views = self._shared_views (shm, header)
+    band = 1024
+    for k, v in views.items ():
+      a = arrays[k][0]
+      for i in range (0, a.shape[0], band):
+        v[i:i + band] = a[i:i + band]
+
+    self._shm       = shm
+    self._shm_owner = True
+    self._use_shared (views)
+
+    return shm.name
+
+  @classmethod
+  def attach (cls, name, ibcao_grd_file = _ibcao_grid, **kwargs):
+    """
+    Create an instance that uses the grid and coefficients in the shared
+    memory block `name` created by `share` in another process. The grd file
+    is still opened for the metadata.
+
+    Args:
+      name: name of the shared memory block
+      ibcao_grd_file: path to the IBCAO grd file
+      kwargs: passed on to `IBCAO`
+
+    Returns:
+      IBCAO
+    """
+    import json
+    from multiprocessing import shared_memory
+
+    i = cls (ibcao_grd_file, **kwargs)
+
+    try:
+      shm = shared_memory.SharedMemory (name = name, track = False)
+    except TypeError:
+      # python < 3.13: keep the resource tracker from removing the block when
+      # this process exits. unregistering afterwards does not work for forked
+      # processes, which share the tracker with the owner.
+      from multiprocessing import resource_tracker
+      register = resource_tracker.register
+      resource_tracker.register = lambda *args: None
+      try:
+        shm = shared_memory.SharedMemory (name = name)
+      finally:
+        resource_tracker.register = register
+
+    header = json.loads (bytes (shm.buf[:cls._shm_header]).rstrip (b'\0').decode ())
+
+    i._shm       = shm
+    i._shm_owner = False
+    i._use_shared (i._shared_views (shm, header))
+
+    return i
+
+  @staticmethod
+  def _shared_views (shm, header):
+    return { k : np.ndarray (h['shape'], dtype = np.dtype (h['dtype']),
+                             buffer = shm.buf, offset = h['offset'])
+             for k, h in header.items () }
+
+  def _use_shared (self, views):
+    self._shared = views
+    self._native = views['z']
+
+    # use the shared coefficients rather than private copies
+    self._coeffs.clear ()
+
+  def _close_shared (self):
+    if self._shm is None:
+      return
+
+    self._shared = {}
+    self._native = None
+
+    try:
+      self._shm.close ()
+    except BufferError:
+      print ("ibcao: shared memory is still referenced, it will be released when the references are removed.")
+
+    if self._shm_owner:
+      self._shm.unlink ()
+
+    self._shm = None
+
+  def cache_info (self):
+    """
+    Statistics for the cache of tile interpolators used by `interp_depth`.
+
+    Returns:
+      CacheInfo: named tuple with `hits`, `misses`, `evictions`, `build_time`
+                 (seconds spent fitting), `currsize` (number of tiles),
+                 `nbytes` (bytes held) and `maxbytes` (the budget).
+    """
+    return self._splines.info ()
+
+  def clear_cache (self):
+    """
+    Release the cached interpolators of `interp_depth`, the spline
+    coefficients of `map_depth`, the overviews, the longitude and latitude
+    tables, the isobath indexes and the derived fields (e.g. the ocean mask),
+    and reset the cache statistics. Sidecar files are left on disk.
+    """
+    self._splines.clear ()
+    self._coeffs.clear ()
+    self._overviews.clear ()
+    self._lonlat.clear ()
+    self._isobaths.clear ()
+    self._fields.clear ()
+
   def get_cartopy (self):
     """
     Deprecated: Use `ups`.
@@ -136,6 +559,7 @@ class IBCAO:
     Returns a Cartopy instance set up for the IBCAO UPS variant. A separate
     instance is used internally.
     """
+    import cartopy.crs as ccrs
     m = ccrs.Stereographic (central_latitude = self.origin_lat,
                             central_longitude = self.origin_lon,
                             false_easting   = 0,
@@ -150,8 +574,30 @@ class IBCAO:
     Returns a Cartopy Stereographic instance set up for the Universal Polar
     Stereographic (UPS) projection used in the IBCAO.
     """
+    if self._ups is None:
+      self._ups = self.get_cartopy ()
+
     return self._ups
 
+  @property
+  def projection (self):
+    """
+    Same as `ups`.
+    """
+    return self.ups
+
+  @property
+  def g (self):
+    """
+    Returns a Cartopy Geodetic instance, short-cut for transforming from
+    longitude and latitude.
+    """
+    if self._g is None:
+      import cartopy.crs as ccrs
+      self._g = ccrs.Geodetic ()
+
+    return self._g
+
 
   @property
   def proj_str (self):
@@ -166,7 +612,6 @@ class IBCAO:
       +lat_ts=%(lat_ts)f
       +lat_0=%(origin_lat)f
       +lon_0=%(origin_lon)f
-      +k_0=%(scale_factor)f
       +x_0=%(x0)f
       +y_0=%(y0)f
       """ % {
@@ -176,7 +621,6 @@ class IBCAO:
         'lat_ts' : self.true_scale,
         'origin_lat' : self.origin_lat,
         'origin_lon' : self.origin_lon,
-        'scale_factor' : self.scale_factor,
         'x0' : 0,
         'y0' : 0
         }
@@ -186,207 +630,2412 @@ class IBCAO:
     """
     Returns a Proj.4 instance set up for the IBCAO UPS variant
     """
+    from pyproj import Proj
     return Proj (self.proj_str)
 
-  @property
-  def geod (self):
-    """
-    Return a `pyproj.Geoid` set up with the WGS84 ellipsoid.
+  def profile (self, tracks, spacing_m = 500., method = 'map', order = 3, window = False):
     """
-    return Geod (ellps = self.ellps)
+    Sample depth profiles along many tracks at once.
 
-  ## depth retrieval functions
-  #
-  # map_depth is less memory intensive, while interp_depth
-  # relies on building an interpolation function. if possible,
-  # use map_depth.
+    The tracks are densified along the geodesics between their vertices, so
+    that consecutive points are at most `spacing_m` apart (every segment is
+    divided in equal steps). All points of all tracks are then sampled with a
+    single call to `depth_at`.
 
-  _depth_f  = None
-  def interp_depth (self, x, y):
-    """
-    Interpolate depth at `x` and `y` using `scipy.interpolate.RectBivariateSpline`.
+    The results are ragged: the points of track `k` are
+    `offsets[k]:offsets[k + 1]` in the flat arrays.
 
-    This method is more accurate but slower than `map_depth`.
+    Args:
+      tracks: sequence of tracks, each an (n, 2) array-like of (longitude,
+              latitude) vertices in degrees.
+      spacing_m: maximum distance between points in meters (default 500 m,
+                 the grid resolution)
+      method: 'map' (default) uses `map_depth`, 'interp' uses `interp_depth`.
+      order: spline order for 'map' (default 3)
+      window: use windowed interpolation for 'map' (see `map_depth`)
 
-    The interpolation function is cached, so later interpolations should be
-    faster.
+    Returns:
+      Profile: named tuple with `offsets` (number of tracks + 1), and the flat
+               arrays `lon`, `lat`, `distance` (along the track in meters)
+               and `depth`.
 
-    Args:
-      x: (1D array) coordinates (longitude) in meters on UPS
-      y: (1D array) coordinates (latitude)  in meters on UPS
+    >>> i = IBCAO ()
+    >>> p = i.profile ([ [(10, 78), (-18, 76)], [(0, 80), (20, 82), (40, 80)] ])
+    >>> for k in range (len (p.offsets) - 1):
+    ...   plt.plot (p.distance[p.offsets[k]:p.offsets[k+1]], p.depth[p.offsets[k]:p.offsets[k+1]])
+    """
+    if spacing_m <= 0:
+      raise ValueError ("spacing_m must be positive")
 
+    tracks = [ np.asarray (t, dtype = np.float64).reshape (-1, 2) for t in tracks ]
+    nv = np.array ([ len(t) for t in tracks ], dtype = np.intp)
+    vo = np.concatenate (([0], np.cumsum (nv)))
+    v  = np.concatenate (tracks) if tracks else np.empty ((0, 2))
 
-    points outside the map are set to `np.nan`.
+    # segments start at every vertex but the last of each track
+    seg = np.ones (len(v), dtype = bool)
+    seg[vo[1:][nv > 0] - 1] = False
+    s0  = np.flatnonzero (seg)
 
-    Returns:
-      z: depths along x and y.
+    az, _, dist = self.geod.inv (v[s0, 0], v[s0, 1], v[s0 + 1, 0], v[s0 + 1, 1])
+    ns = np.maximum (1, np.ceil (dist / spacing_m)).astype (np.intp)
 
-    """
-    from scipy.interpolate import RectBivariateSpline
+    # per vertex: number of points, azimuth and step of the segment it starts
+    npv  = np.ones (len(v), dtype = np.intp)
+    npv[s0] = ns
+    azv  = np.zeros (len(v))
+    azv[s0] = az
+    step = np.zeros (len(v))
+    step[s0] = dist / ns
 
-    if self._depth_f is None:
-      print ("setting up interpolation function..")
-      self._depth_f = RectBivariateSpline (self.x, self.y, self.z)
+    # distance along the track at each vertex
+    sd = np.zeros (len(v))
+    sd[s0] = dist
+    dv = np.cumsum (sd) - sd
+    dv -= np.repeat (dv[vo[:-1][nv > 0]], nv[nv > 0])
 
+    po = np.concatenate (([0], np.cumsum (npv)))
+    vi = np.repeat (np.arange (len(v)), npv)
+    k  = np.arange (po[-1]) - po[vi]
+    ds = k * step[vi]
 
-    d = self._depth_f.ev(y, x)
+    lon, lat, _ = self.geod.fwd (v[vi, 0], v[vi, 1], azv[vi], ds)
+    lon = np.asarray (lon, dtype = np.float64)
+    lat = np.asarray (lat, dtype = np.float64)
 
-    # catch outliers and set to nan
-    d[x<self.xlim[0]] = np.nan
-    d[x>self.xlim[1]] = np.nan
-    d[y<self.ylim[0]] = np.nan
-    d[y>self.ylim[1]] = np.nan
+    # keep the vertices exact
+    first = k == 0
+    lon[first] = v[vi[first], 0]
+    lat[first] = v[vi[first], 1]
 
-    return d
+    depth = self.depth_at (lon, lat, method, order, window)
 
-  def map_depth (self, x, y, order = 3):
-    """
-    Map coordinates `x` and `y` onto `z` in order to retrieve depth using
-    `scipy.ndimage.map_coordinates`.
+    return Profile (po[vo], lon, lat, dv[vi] + ds, depth)
 
-    Args:
-      x: (1D array) coordinates (longitude) in meters on UPS
-      y: (1D array) coordinates (latitude)  in meters on UPS
+  _regrid_methods = { 'nearest' : 0, 'bilinear' : 1, 'cubic' : 3 }
 
+  def regrid (self, target_lon, target_lat, method = 'bilinear'):
+    """
+    Sample the grid onto a target grid of longitudes and latitudes.
+
+    A rectilinear target is given by 1D `target_lon` and `target_lat`, the
+    result then has the shape `(len(target_lat), len(target_lon))`. The
+    projection is separable on such grids: the radius only depends on latitude
+    and the direction only on longitude, so the trigonometry is done once per
+    row and column rather than for every point. A curvilinear target is given
+    by 2D arrays of the same shape, and is sampled in blocks with `depth_at`.
+
+    With the 'mean' method the grid cells are binned to the target cells and
+    averaged, weighted by their true area (see `point_scale`). This is the
+    method to use when the target cells are much coarser than the grid. On a
+    rectilinear target the cells are bounded half way between the target
+    points, on a curvilinear target grid cells are assigned to the nearest
+    target point (within half a target cell diagonal). Cells with nan are
+    left out of the mean, target cells without any grid cells are nan.
 
-    points outside the map are set to `np.nan`.
+    Args:
+      target_lon: (1D or 2D array) longitude of target points in degrees
+      target_lat: (1D or 2D array) latitude of target points in degrees
+      method: 'nearest', 'bilinear' (default), 'cubic' or 'mean'.
 
     Returns:
-      z: depths along x and y.
+      z: depths on the target grid.
 
-    Example: Get points along great circle:
+    To regrid repeatedly onto the same target, the weights can be computed
+    once and kept (see `Weights`).
 
-    >>> start = [10, 78]    # positions in degrees
-    >>> end   = [-18, 76]
-    >>>
-    >>> ## Sample a great circle between the two points using the pyproj.Geod set up by the IBCAO class
-    >>> i  = IBCAO ()
-    >>> gc = np.array(i.get_geod ().npts (start[0], start[1], end[0], end[1], 100))
-    >>>
-    >>> ## Interpolate the depth along the great circle
-    >>> gc_xy = i.ups.transform_points (i.g, gc[:,0], gc[:,1]) # convert to UPS coordinates
-    >>> depth = i.map_depth (gc_xy[:,0], gc_xy[:,1])
+    >>> i = IBCAO ()
+    >>> d = i.regrid (np.arange (-180, 180, .25), np.arange (65, 90, .1), method = 'mean')
     """
-    # this is faster, use if possible
-    from scipy.ndimage import map_coordinates
-    x = (x + self.extent) / self.resolution
-    y = (y + self.extent) / self.resolution
+    if method != 'mean' and method not in self._regrid_methods:
+      raise ValueError ("method must be one of: 'nearest', 'bilinear', 'cubic', 'mean'")
 
-    return map_coordinates (self.z, [y, x], cval = np.nan, order = order)
+    lon = np.asarray (target_lon, dtype = np.float64)
+    lat = np.asarray (target_lat, dtype = np.float64)
 
-  @property
-  def xlim (self):
+    if lon.ndim == 1 and lat.ndim == 1:
+      if method == 'mean':
+        return self._regrid_mean_rect (lon, lat)
+
+      return self._regrid_rect (lon, lat, self._regrid_methods[method])
+
+    elif lon.ndim == 2 and lon.shape == lat.shape:
+      if method == 'mean':
+        return self._regrid_mean_curv (lon, lat)
+
+      return self.depth_at (lon, lat, order = self._regrid_methods[method])
+
+    else:
+      raise ValueError ("target_lon and target_lat must be 1D, or 2D with the same shape")
+
+  def _regrid_rect (self, lon, lat, order):
     """
-    Extent in longitude coordinates (meters) on UPS projection.
+    Interpolate on the rectilinear grid `lon` x `lat`, in blocks of rows.
     """
-    return (-self.extent, self.extent)
+    d  = np.empty ((lat.size, lon.size))
+    dd = d.reshape (-1)
 
-  @property
-  def ylim (self):
+    for i0, i1, r, c in self._target_blocks (lon, lat):
+      self._map_index (r, c, order, output = dd[i0:i1])
+
+    return d
+
+  def _target_blocks (self, lon, lat):
     """
-    Extent in latitude coordinates (meters) on UPS projection.
+    Fractional indices into `z` of the points of a rectilinear (1D `lon` and
+    `lat`) or curvilinear (2D) target grid, in blocks.
+
+    Yields:
+      (i0, i1, r, c): range of the points in the flattened target, and their
+                      row and column indices.
     """
-    return (-self.extent, self.extent)
+    if lon.ndim == 1:
+      # radius of the latitudes, and direction of the longitudes
+      _, rho = self.lonlat_to_xy (np.full (lat.shape, float (self.origin_lon)), lat)
+      np.negative (rho, out = rho)
 
-  @property
-  def imextent(self):
-    return [*self.xlim, *self.ylim]
+      l  = np.radians (lon - self.origin_lon)
+      sl = np.sin (l)
+      cl = -np.cos (l)
 
+      nb = max (1, self._chunk // max (1, lon.size))
 
+      for i0 in range (0, lat.size, nb):
+        i1 = min (i0 + nb, lat.size)
+        x  = np.multiply.outer (rho[i0:i1], sl)
+        y  = np.multiply.outer (rho[i0:i1], cl)
 
-  @property
-  def x (self):
-    """
-    `x` (longitude) arguments for depth data (`z`) in meters (UPS).
-    """
-    return self.ups_x.data
+        r, c = self._index (x, y, out = (y, x))
+        yield i0 * lon.size, i1 * lon.size, r.ravel (), c.ravel ()
 
-  @property
-  def y (self):
+    else:
+      lon = lon.ravel ()
+      lat = lat.ravel ()
+
+      for i0 in range (0, lon.size, self._chunk):
+        i1 = min (i0 + self._chunk, lon.size)
+        x, y = self.lonlat_to_xy (lon[i0:i1], lat[i0:i1])
+
+        r, c = self._index (x, y, out = (y, x))
+        yield i0, i1, r, c
+
+  @staticmethod
+  def _edges (v):
     """
-    `y` (latitude) arguments for depth data (`z`) in meters (UPS).
+    Cell edges half way between the points `v`, extended by half a step at
+    the ends.
     """
-    return self.ups_y.data
+    e = np.empty (v.size + 1)
+    e[1:-1] = (v[1:] + v[:-1]) / 2.
+    e[0]  = v[0] - (v[1] - v[0]) / 2. if v.size > 1 else v[0]
+    e[-1] = v[-1] + (v[-1] - v[-2]) / 2. if v.size > 1 else v[-1]
+    return e
 
-  @property
-  def z (self):
+  def _scale_table (self):
     """
-    Depth data on `grid`.
+    Returns a function for the point scale (see `point_scale`) at radius
+    `rho` from the pole, interpolated from a table.
     """
-    return self._z.data
+    lat = np.linspace (90., 40., 50001)
+    _, rho = self.lonlat_to_xy (np.full (lat.shape, float (self.origin_lon)), lat)
+    np.negative (rho, out = rho)
+    k = self.point_scale (lat)
+
+    return lambda r: np.interp (r, rho, k)
 
-  def grid (self, div = 1):
+  def _bin_blocks (self, locate, rho_max = None, bbox = None):
     """
-    Create position grid for IBCAO
+    Assign the grid cells to target cells, in blocks of rows.
 
     Args:
-      div:  Skip every div point (1 include all, default) corresponds to
-            `div` in `template()`.
+      locate: function of (x, y) of the grid cells returning the flat index
+              of the target cell, or -1 for cells outside the target.
+      rho_max: only grid cells within this radius are considered
+      bbox: only grid cells within (x0, x1, y0, y1) are considered
+
+    Yields:
+      ((r0, r1, c0, c1), k, a): the block of grid cells, the target index and
+                                the true area of every cell in the block.
+    """
+    x0, x1, y0, y1 = bbox if bbox is not None else (-rho_max, rho_max, -rho_max, rho_max)
+    ny, nx = self.z.shape
+    res = self.resolution
+    c0 = max (0, int (np.floor ((x0 - self._x0) / res)))
+    c1 = min (nx, int (np.ceil ((x1 - self._x0) / res)) + 1)
+    r0 = max (0, int (np.floor ((y0 - self._y0) / res)))
+    r1 = min (ny, int (np.ceil ((y1 - self._y0) / res)) + 1)
+
+    scale = self._scale_table ()
+    area  = lambda r: self.resolution**2 / scale (r)**2
+    x  = self._x0 + np.arange (c0, c1) * res
+    nb = max (1, 16 * self._chunk // max (1, c1 - c0))
+
+    for i0 in range (r0, r1, nb):
+      i1 = min (i0 + nb, r1)
+      y  = self._y0 + np.arange (i0, i1) * res
+      xx, yy = np.meshgrid (x, y)
+
+      yield (i0, i1, c0, c1), locate (xx, yy), area (np.hypot (xx, yy))
+
+  def _bin_mean (self, locate, shape, rho_max = None, bbox = None):
+    """
+    Area weighted mean of the grid cells over target cells (see
+    `_bin_blocks`).
 
     Returns:
-      (x, y): A tuple with `x` and `y` grid for `z`.
+      mean on the target.
     """
-    y, x = np.mgrid[self.ylim[0]:self.ylim[1]:(self.resolution*div), self.xlim[0]:self.xlim[1]:(self.resolution*div)]
-    return (x, y)
+    n = int (np.prod (shape))
+    s = np.zeros (n)
+    w = np.zeros (n)
+
+    for (r0, r1, c0, c1), k, a in self._bin_blocks (locate, rho_max, bbox):
+      z = np.asarray (self._region (r0, r1, c0, c1), dtype = np.float64)
+      m = (k >= 0) & ~np.isnan (z)
+      if not m.any ():
+        continue
 
-  def Colormap (self):
+      k  = k[m]
+      a  = a[m]
+      s += np.bincount (k, weights = a * z[m], minlength = n)
+      w += np.bincount (k, weights = a, minlength = n)
+
+    with np.errstate (divide = 'ignore', invalid = 'ignore'):
+      return (s / w).reshape (shape)
+
+  def _regrid_mean_rect (self, lon, lat):
     """
-    Returns a discrete colormap and norm based on the official IBCAO colormap.
+    Area weighted mean over the cells of the rectilinear grid `lon` x `lat`.
+    """
+    locate, rho_max = self._locate_rect (lon, lat)
+    return self._bin_mean (locate, (lat.size, lon.size), rho_max = rho_max)
 
-    Returns:
-      (cmap, norm): A tuple with the colormap and the norm
+  def _locate_rect (self, lon, lat):
+    """
+    Returns a function locating grid cells in the cells of the rectilinear
+    grid `lon` x `lat`, and the largest radius of the cells. The cells are
+    bounded half way between the points, and located by radius (latitude)
+    and direction (longitude) directly in UPS coordinates.
+    """
+    if np.any (np.diff (lon) <= 0) or np.any (np.diff (lat) == 0) or \
+        (lat.size > 1 and np.any (np.diff (lat) * (lat[-1] - lat[0]) < 0)):
+      raise ValueError ("target_lon must be increasing and target_lat monotonic")
 
-    Example:
+    le = self._edges (lon)
+    if le[-1] - le[0] > 360.:
+      raise ValueError ("target_lon spans more than 360 degrees")
 
-    >>> (cmap, norm) = self.Colormap ()
-    >>> cm = ax.pcolormesh (x, y, z, cmap = cmap, norm = norm)
-    >>> plt.colorbar (cm)
+    # radius of latitude edges, increasing
+    flip = lat.size > 1 and lat[-1] > lat[0]
+    pe   = np.clip (self._edges (lat[::-1] if flip else lat), -90., 90.)
+    _, re = self.lonlat_to_xy (np.full (pe.shape, float (self.origin_lon)), pe)
+    np.negative (re, out = re)
 
+    nlon = lon.size
+    nlat = lat.size
+
+    def locate (x, y):
+      ir = np.searchsorted (re, np.hypot (x, y), side = 'right') - 1
+      if flip:
+        ir = nlat - 1 - ir
+
+      # direction relative to the first edge in [0, 360)
+      l  = np.degrees (np.arctan2 (x, -y)) + self.origin_lon - le[0]
+      np.mod (l, 360., out = l)
+      il = np.searchsorted (le - le[0], l, side = 'right') - 1
+
+      k = ir * nlon + il
+      k[(ir < 0) | (ir >= nlat) | (il < 0) | (il >= nlon)] = -1
+      return k
+
+    return locate, re[-1]
+
+  def _regrid_mean_curv (self, lon, lat):
+    """
+    Area weighted mean over the cells of the curvilinear grid `lon`, `lat`.
     """
+    locate, rho_max, bbox = self._locate_curv (lon, lat)
+    return self._bin_mean (locate, lon.shape, rho_max = rho_max, bbox = bbox)
 
-    # loader based on: http://wiki.scipy.org/Cookbook/Matplotlib/Loading_a_colormap_dynamically and
-    #   http://stackoverflow.com/questions/26559764/matplotlib-pcolormesh-discrete-colors
+  def _locate_curv (self, lon, lat):
+    """
+    Returns a function locating grid cells in the cells of the curvilinear
+    grid `lon`, `lat`, the largest radius and the bounding box of the cells.
+    Grid cells are assigned to the nearest target point in UPS coordinates.
+    """
+    from scipy.spatial import cKDTree
 
-    cmap = np.empty ((0,4))
-    c = 0
+    tx, ty = self.lonlat_to_xy (lon, lat)
 
-    for l in self._COLORMAP.split("\n"):
-      l = l.strip()
+    # largest spacing between neighbouring target points
+    sp = 0.
+    for ax in (0, 1):
+      if lon.shape[ax] > 1:
+        sp = max (sp, np.nanmax (np.hypot (np.diff (tx, axis = ax), np.diff (ty, axis = ax))))
 
-      if len(l) == 0 or l[0] == '#':
-        continue
+    bound = sp / np.sqrt (2.)
+    valid = np.isfinite (tx) & np.isfinite (ty)
+    t  = cKDTree (np.column_stack ((tx[valid], ty[valid])))
+    ti = np.flatnonzero (valid.ravel ())
 
-      ls = np.array([float (v) for v in l.split ()])
+    def locate (x, y):
+      _, k = t.query (np.column_stack ((x.ravel (), y.ravel ())),
+                      distance_upper_bound = bound, workers = -1)
+      out = ti[np.minimum (k, ti.size - 1)]
+      out[k >= ti.size] = -1
+      return out.reshape (x.shape)
 
-      if ls.shape[0] < 8:
-        continue
+    bbox = (tx[valid].min () - bound, tx[valid].max () + bound,
+            ty[valid].min () - bound, ty[valid].max () + bound)
+    rho_max = np.hypot (max (abs (bbox[0]), abs (bbox[1])), max (abs (bbox[2]), abs (bbox[3])))
 
-      c += 1
-      cmap.resize (c, 4)
-      cmap[c-1,:] = ls[:4]
+    return locate, rho_max, bbox
 
-    # add end spec
-    c += 1
-    cmap.resize (c, 4)
-    cmap[c-1,:] = ls[4:]
+  @property
+  def geod (self):
+    """
+    Return a `pyproj.Geoid` set up with the WGS84 ellipsoid.
+    """
+    from pyproj import Geod
+    return Geod (ellps = self.ellps)
 
-    # normalize colors
-    cmap[:,[1, 2, 3]] = cmap[:,[1, 2, 3]] / 255.
+  def _stere_constants (self):
+    """
+    Returns eccentricity `e` and the scale `a * m_c / t_c` of the polar
+    stereographic projection with true scale at `true_scale` (Snyder, 1987,
+    Map Projections - A Working Manual, eq. 21-33 to 21-35).
+    """
+    e  = np.sqrt (self.flattening * (2 - self.flattening))
+    pc = np.radians (self.true_scale)
+    sc = np.sin (pc)
 
-    cmap_out = cm.colors.ListedColormap (cmap[:,1:4], 'ibcao', c)
-    norm     = cm.colors.BoundaryNorm (cmap[:,0], c)
+    mc = np.cos (pc) / np.sqrt (1 - (e * sc)**2)
+    tc = np.tan (np.pi / 4 - pc / 2) / ((1 - e * sc) / (1 + e * sc))**(e / 2)
 
-    return (cmap_out, norm)
+    return e, self.semi_major * mc / tc
 
-  def template (self, div = 1):
+  def lonlat_to_xy (self, lon, lat, out = None):
     """
-    Sets up and returns a figure with the IBCAO map loaded, ready for additional plotting:
+    Transform longitude and latitude to UPS coordinates using the polar
+    stereographic formulas with the IBCAO parameters. This is equivalent to
+    transforming with `ups` or `proj`, but avoids the overhead of cartopy.
 
     Args:
-      div: use every div point in map (1 is default, use all points)
+      lon: (array) longitude in degrees
+      lat: (array) latitude in degrees, broadcastable with `lon`
+      out: optional tuple of two float64 arrays (x, y) with the broadcast
+           shape of `lon` and `lat` that the result is written to.
 
     Returns:
-      matplotlib Figure
+      (x, y): UPS coordinates in meters.
+    """
+    lon = np.asarray (lon, dtype = np.float64)
+    lat = np.asarray (lat, dtype = np.float64)
+    shape = np.broadcast_shapes (lon.shape, lat.shape)
+
+    if out is None:
+      x = np.empty (shape)
+      y = np.empty (shape)
+    else:
+      x, y = out
+
+    e, k = self._stere_constants ()
+
+    # x <- ((1 - e sin phi) / (1 + e sin phi))**(e/2)
+    np.radians (lat, out = y)
+    np.sin (y, out = x)
+    x *= e
+    tmp = np.empty (shape)
+    np.add (1., x, out = tmp)
+    np.subtract (1., x, out = x)
+    x /= tmp
+    x **= (e / 2)
+
+    # y <- rho = k * tan (pi/4 - phi/2) / x
+    y *= -.5
+    y += np.pi / 4
+    np.tan (y, out = y)
+    y /= x
+    y *= k
+
+    # x, y <- rho * (sin lambda, -cos lambda)
+    np.subtract (lon, self.origin_lon, out = tmp)
+    np.radians (tmp, out = tmp)
+    np.sin (tmp, out = x)
+    x *= y
+    np.cos (tmp, out = tmp)
+    y *= tmp
+    np.negative (y, out = y)
+
+    return (x, y)
+
+  def xy_to_lonlat (self, x, y, out = None):
+    """
+    Transform UPS coordinates to longitude and latitude, the inverse of
+    `lonlat_to_xy`. Latitude is computed from the conformal latitude using
+    the series of Snyder (1987, eq. 3-5).
+
+    Args:
+      x: (array) UPS coordinates in meters
+      y: (array) UPS coordinates in meters, broadcastable with `x` (e.g.
+         from `grid` with `sparse`)
+      out: optional tuple of two float64 arrays (lon, lat) with the
+           broadcast shape of `x` and `y` that the result is written to.
+
+    Returns:
+      (lon, lat): longitude and latitude in degrees.
+    """
+    x = np.asarray (x, dtype = np.float64)
+    y = np.asarray (y, dtype = np.float64)
+    shape = np.broadcast_shapes (x.shape, y.shape)
+
+    if out is None:
+      lon = np.empty (shape)
+      lat = np.empty (shape)
+    else:
+      lon, lat = out
+
+    e, k = self._stere_constants ()
+    e2 = e**2
+    e4 = e2**2
+    e6 = e4 * e2
+    e8 = e4**2
+
+    # lat <- chi = pi/2 - 2 atan (rho / k)
+    np.hypot (x, y, out = lat)
+    lat /= k
+    np.arctan (lat, out = lat)
+    lat *= -2.
+    lat += np.pi / 2
+
+    # lat <- phi = chi + sum c_n sin (n chi), series accumulated in lon
+    tmp = np.empty (shape)
+    lon[...] = 0.
+    for n, c in ((2, e2 / 2 + 5 * e4 / 24 + e6 / 12 + 13 * e8 / 360),
+                 (4, 7 * e4 / 48 + 29 * e6 / 240 + 811 * e8 / 11520),
+                 (6, 7 * e6 / 120 + 81 * e8 / 1120),
+                 (8, 4279 * e8 / 161280)):
+      np.multiply (lat, n, out = tmp)
+      np.sin (tmp, out = tmp)
+      tmp *= c
+      lon += tmp
+
+    lat += lon
+    np.degrees (lat, out = lat)
+
+    # lon <- origin_lon + atan2 (x, -y), wrapped to [-180, 180)
+    np.negative (y, out = tmp)
+    np.arctan2 (x, tmp, out = lon)
+    np.degrees (lon, out = lon)
+    if self.origin_lon != 0:
+      lon += self.origin_lon + 180.
+      np.mod (lon, 360., out = lon)
+      lon -= 180.
+
+    return (lon, lat)
+
+  def point_scale (self, lat):
+    """
+    Point scale factor `k` of the projection at latitude `lat` (Snyder, 1987,
+    eq. 21-32, and 21-35 at the pole). Lengths on the map are `k` times the
+    true length, so a grid cell covers `resolution**2 / k**2` square meters.
+
+    Args:
+      lat: (array) latitude in degrees
+
+    Returns:
+      k: scale factor, 1 at `true_scale`.
+    """
+    lat = np.asarray (lat, dtype = np.float64)
+    e, K = self._stere_constants ()
+
+    _, y = self.lonlat_to_xy (np.full (lat.shape, float (self.origin_lon)), lat)
+
+    phi = np.radians (lat)
+    m   = np.cos (phi) / np.sqrt (1 - (e * np.sin (phi))**2)
+    kp  = K / self.semi_major * np.sqrt ((1 + e)**(1 + e) * (1 - e)**(1 - e)) / 2
+
+    with np.errstate (divide = 'ignore', invalid = 'ignore'):
+      return np.where (m > 1e-12, -y / (self.semi_major * m), kp)
+
+  def _sidecar (self, name):
+    """
+    Returns the path of the sidecar file for the derived data `name`.
+    """
+    base = os.path.splitext (os.path.basename (self.ibcao_grid))[0]
+    if self._parent is not None:
+      base += '.%d_%d_%d_%d' % self._window
+
+    return os.path.join (self.cache_dir, '%s.%s.npy' % (base, name))
+
+  def _load_sidecar (self, name, shape):
+    """
+    Memory-map the sidecar file for `name` if it exists, is newer than the grid
+    and has the expected shape (any shape if `shape` is `None`). Returns `None`
+    otherwise.
+    """
+    fname = self._sidecar (name)
+    if not os.path.exists (fname) or os.path.getmtime (fname) < os.path.getmtime (self.ibcao_grid):
+      return None
+
+    a = np.load (fname, mmap_mode = 'r')
+    if shape is not None and a.shape != tuple(shape):
+      return None
+
+    return a
+
+  def _save_sidecar (self, name, a):
+    """
+    Write `a` to the sidecar file for `name` and return it memory-mapped. The
+    file is written to a temporary name first, so that concurrent processes
+    never see a partial file.
+    """
+    fname = self._sidecar (name)
+    tmp = '%s.%d.tmp' % (fname, os.getpid ())
+    with open (tmp, 'wb') as fd:
+      np.save (fd, a)
+    os.replace (tmp, fname)
+
+    return np.load (fname, mmap_mode = 'r')
+
+  def _write_sidecar (self, name, shape, dtype, fill):
+    """
+    Create the sidecar file for `name` with an array of `shape` and `dtype`,
+    which is filled in place by `fill (a)` (e.g. in bands), and return it
+    memory-mapped. As with `_save_sidecar` the file is written to a temporary
+    name first.
+    """
+    fname = self._sidecar (name)
+    tmp = '%s.%d.tmp' % (fname, os.getpid ())
+
+    a = np.lib.format.open_memmap (tmp, mode = 'w+', dtype = dtype, shape = shape)
+    fill (a)
+    a.flush ()
+    del a
+    os.replace (tmp, fname)
+
+    return np.load (fname, mmap_mode = 'r')
+
+  def _tiles_path (self):
+    base = os.path.splitext (os.path.basename (self.ibcao_grid))[0]
+    return os.path.join (self.cache_dir, base + '.tiles')
+
+  def _load_tiles (self):
+    """
+    Open the tiled copy of the grid if it exists and is newer than the grid.
+    """
+    path = self._tiles_path ()
+    meta = os.path.join (path, 'meta.json')
+    if not os.path.exists (meta) or os.path.getmtime (meta) < os.path.getmtime (self.ibcao_grid):
+      return None
+
+    g = _sibling ('tiled').TiledGrid (path)
+    if g.shape != self._grid.shape:
+      return None
+
+    return g
+
+  def convert (self, tile = 256, compress = False):
+    """
+    Convert the (full) grid to a tiled, native-endian copy (see `TiledGrid`)
+    in `cache_dir`. Later instances use the tiles for reading regions of the
+    grid (windowed `map_depth`, `interp_depth` and overviews), which only
+    reads the tiles that overlap the region.
+
+    This can also be run as:
+
+      $ python -m ibcao.tiled IBCAO_V3_500m_RR.grd [--tile 256] [--compress]
+
+    Args:
+      tile: tile size in cells (default 256)
+      compress: compress the tiles, smaller on disk but the tiles must be
+                decompressed when read (default False)
+
+    Returns:
+      TiledGrid
+    """
+    print ("ibcao: converting grid to tiles..")
+    self._tiles = _sibling ('tiled').TiledGrid.convert (self._grid, self._tiles_path (), tile, compress)
+
+    return self._tiles
+
+  def _region (self, r0, r1, c0, c1, beyond = False):
+    """
+    Returns the region `z[r0:r1, c0:c1]`, read from the tiles if available.
+    With `beyond` the region of a subset may reach past its window into the
+    rest of the grid (negative indices are before the window), see
+    `_padding`.
+    """
+    R0, R1, C0, C1 = self._window
+    if beyond:
+      ny, nx = self._grid.shape
+      R1, C1 = ny + R0, nx + C0
+      r0, c0 = max (-R0, r0), max (-C0, c0)
+    else:
+      r0, c0 = max (0, r0), max (0, c0)
+
+    r1 = min (R1 - R0, r1)
+    c1 = min (C1 - C0, c1)
+
+    if self._tiles is not None:
+      return self._tiles.read (R0 + r0, R0 + r1, C0 + c0, C0 + c1)
+
+    return self._grid[R0 + r0:R0 + r1, C0 + c0:C0 + c1]
+
+  def _padding (self, m):
+    """
+    Returns the number of cells (top, bottom, left, right), up to `m`, the
+    grid extends past the window of a subset. Zero for the full grid.
+    """
+    R0, R1, C0, C1 = self._window
+    ny, nx = self._grid.shape
+    return (min (m, R0), min (m, ny - R1), min (m, C0), min (m, nx - C1))
+
+  def native_z (self):
+    """
+    Returns a native-endian (float32) copy of `z`, memory-mapped from a `.npy`
+    sidecar in `cache_dir`. The copy is written once (in bands of rows) and
+    reused by later instances and other processes.
+
+    The grd file stores `z` as big-endian, which NumPy and SciPy have to
+    byteswap or convert on every operation. With `native` enabled `z` returns
+    this copy, so all operations on the grid avoid the conversion.
+    """
+    if self._parent is not None:
+      return self._parent.native_z ()
+
+    with self._lock:
+      shape = self._z.data.shape
+      n = self._load_sidecar ('z', shape)
+
+      if n is None or n.dtype != np.float32 or not n.dtype.isnative:
+        print ("ibcao: writing native-endian copy of grid..")
+
+        def fill (n):
+          band = 1024
+          for i in range (0, shape[0], band):
+            n[i:i + band, :] = self._z.data[i:i + band, :]
+
+        n = self._write_sidecar ('z', shape, np.float32, fill)
+
+    return n
+
+  def coefficients (self, order = 3, level = 0):
+    """
+    Spline coefficients of `z` for interpolation of `order`, as computed by
+    the prefilter of `scipy.ndimage.map_coordinates`.
+
+    The prefilter runs over the entire grid, so the coefficients are computed
+    on first use and kept for later calls. With `persist` enabled they are also
+    stored in a `.npy` sidecar, which is memory-mapped by later instances.
+
+    For a subset the prefilter runs over the window padded by `_margin` +
+    `order` cells of the grid on each side, so that the coefficients match
+    those of the full grid up to the edge of the window. The padding is
+    included in the coefficients.
+
+    Args:
+      order: spline order (0-5), for `order` <= 1 no prefilter is needed and
+             `z` is returned.
+      level: overview level (see `overview`), default 0 is the full grid.
+
+    Returns:
+      coefficients with the same shape as `z` (or the overview), plus the
+      padding (see `_padding`) for a subset.
+    """
+    a = self._level (level)
+    if order <= 1:
+      return a
+
+    pt, pb, pl, pr = self._padding (self._margin + order) if level == 0 else (0, 0, 0, 0)
+
+    if level == 0 and 'spline%d' % order in self._shared:
+      return self._shared['spline%d' % order]
+
+    with self._lock:
+      c = self._coeffs.get ((order, level))
+      if c is None:
+        name = 'spline%d' % order if level == 0 else 'spline%d_ovr%d' % (order, level)
+        c = self._load_sidecar (name, (a.shape[0] + pt + pb, a.shape[1] + pl + pr))
+
+        if c is None:
+          from scipy.ndimage import spline_filter
+          print ("ibcao: computing spline coefficients (order %d).." % order)
+          if pt or pb or pl or pr:
+            a = self._region (-pt, a.shape[0] + pb, -pl, a.shape[1] + pr, beyond = True)
+
+          c = spline_filter (a, order, output = np.float64, mode = 'constant')
+
+          if self.persist:
+            c = self._save_sidecar (name, c)
+
+        self._coeffs[(order, level)] = c
+
+    return c
+
+  ## overviews
+  #
+  # level n has cells of 2**n x 2**n grid cells, reduced from level n - 1 in
+  # blocks of 2x2 cells.
+  _reductions = { 'mean' : np.nanmean, 'min' : np.nanmin, 'max' : np.nanmax }
+
+  @staticmethod
+  def _reduce2 (a, fn):
+    """
+    Reduce `a` in blocks of 2x2 cells with `fn`, uneven edges are padded with
+    nan.
+    """
+    ny, nx = a.shape
+    b = np.full ((ny + ny % 2, nx + nx % 2), np.nan)
+    b[:ny, :nx] = a
+    b = b.reshape (b.shape[0] // 2, 2, b.shape[1] // 2, 2)
+
+    return fn (b, axis = (1, 3)).astype (np.float32)
+
+  def _level (self, level):
+    """
+    Returns `z` for level 0, or the mean overview at `level`.
+    """
+    if level == 0:
+      return self.z
+
+    return self.overview (level)[2]
+
+  def overview (self, level = 1, reduce = 'mean'):
+    """
+    Overview of the grid where each cell covers 2**level x 2**level cells of
+    `z`, reduced by `reduce`.
+
+    The overviews are computed on first use from the previous level, reading
+    the full grid only once (in bands), and kept for later calls. With
+    `persist` enabled they are stored in `.npy` sidecars which are
+    memory-mapped by later instances.
+
+    Args:
+      level: overview level, 0 is the full grid
+      reduce: 'mean' (default), 'min' or 'max'
+
+    Returns:
+      (x, y, z): coordinates of the cell centers in meters (UPS) and the
+                 (float32) overview. Cells at the upper edges may cover fewer
+                 grid cells when the grid size is not divisible by 2**level.
+    """
+    if reduce not in self._reductions:
+      raise ValueError ("reduce must be one of: %s" % ', '.join (self._reductions))
+
+    if level == 0:
+      return (self.x, self.y, self.z)
+
+    with self._lock:
+      o = self._overviews.get ((level, reduce))
+      if o is None:
+        shape = self.z.shape
+        for _ in range (level):
+          shape = ((shape[0] + 1) // 2, (shape[1] + 1) // 2)
+
+        name = 'ovr%d_%s' % (level, reduce)
+        o = self._load_sidecar (name, shape)
+
+        if o is None:
+          fn = self._reductions[reduce]
+
+          if level == 1:
+            print ("ibcao: computing overview..")
+            band = 1024
+            o = np.concatenate ([ self._reduce2 (self._region (i, i + band, 0, self.z.shape[1]), fn)
+                                  for i in range (0, self.z.shape[0], band) ])
+          else:
+            o = self._reduce2 (self.overview (level - 1, reduce)[2], fn)
+
+          if self.persist:
+            o = self._save_sidecar (name, o)
+
+        self._overviews[(level, reduce)] = o
+
+    x, y = self._axes (1, level)
+    return (x, y, o)
+
+  ## depth retrieval functions
+  #
+  # map_depth is less memory intensive, while interp_depth
+  # relies on building an interpolation function. if possible,
+  # use map_depth.
+
+  # interp_depth fits splines on tiles of `_spline_tile` cells, padded by
+  # `_spline_margin` cells so that the fit in the tile matches a fit on the
+  # full grid.
+  _spline_tile   = 256
+  _spline_margin = 16
+
+  def _tile_spline (self, tr, tc):
+    """
+    Fit a `scipy.interpolate.RectBivariateSpline` on tile (`tr`, `tc`).
+    """
+    from scipy.interpolate import RectBivariateSpline
+
+    ny, nx = self.z.shape
+    t = self._spline_tile
+    m = self._spline_margin
+
+    # tiles of a subset are padded into the grid around it
+    pt, pb, pl, pr = self._padding (m)
+    r0 = max (-pt, tr * t - m)
+    r1 = min (ny + pb, (tr + 1) * t + m + 1)
+    c0 = max (-pl, tc * t - m)
+    c1 = min (nx + pr, (tc + 1) * t + m + 1)
+
+    R0, _, C0, _ = self._window
+    return RectBivariateSpline (self.ups_y.data[R0 + r0:R0 + r1], self.ups_x.data[C0 + c0:C0 + c1],
+                                self._region (r0, r1, c0, c1, beyond = True))
+
+  def interp_depth (self, x, y, workers = None):
+    """
+    Interpolate depth at `x` and `y` using `scipy.interpolate.RectBivariateSpline`.
+
+    This method is more accurate but slower than `map_depth`.
+
+    Splines are fitted on tiles of the grid where the points fall, rather
+    than on the full grid. The tiles are padded so that the result matches a
+    fit on the full grid. The fitted tiles are kept in a least recently used
+    cache limited to `cache_size` bytes, so later interpolations in the same
+    area are faster.
+
+    Args:
+      x: (array) coordinates (longitude) in meters on UPS
+      y: (array) coordinates (latitude)  in meters on UPS, broadcastable
+         with `x`
+      workers: split the points across this many threads (see `Sampler`)
+
+
+    points outside the map are set to `np.nan`.
+
+    Returns:
+      z: depths along x and y.
+
+    """
+    if workers is not None and workers > 1:
+      with _sibling ('sampler').Sampler (self, workers) as s:
+        return s.interp_depth (x, y)
+
+    x, y = np.asarray (x, dtype = np.float64), np.asarray (y, dtype = np.float64)
+    n = max (x.size, y.size)
+    x, y = np.broadcast_arrays (x, y)
+
+    if x.size > n:
+      # broadcast inputs (e.g. from a sparse grid) are expanded one block at
+      # the time
+      d = np.empty (x.shape)
+      for s in self._blocks (x.shape, self._chunk):
+        d[s] = self.interp_depth (np.ascontiguousarray (x[s]), np.ascontiguousarray (y[s]))
+
+      return d
+
+    d = np.full (x.size, np.nan)
+
+    # points outside are left as nan
+    m  = (x >= self.xlim[0]) & (x <= self.xlim[1]) & \
+         (y >= self.ylim[0]) & (y <= self.ylim[1])
+    inside = np.flatnonzero (m)
+    xi = x[m]
+    yi = y[m]
+    ri, ci = self._index (xi, yi)
+
+    size = lambda spl: sum (a.nbytes for a in spl.tck)
+
+    for (tr, tc), k in self._group_tiles (ri, ci, self._spline_tile, self.z.shape):
+      spl = self._splines.get ((tr, tc), lambda: self._tile_spline (tr, tc), size)
+      d[inside[k]] = spl.ev (yi[k], xi[k])
+
+    return d.reshape (x.shape)
+
+  # windowed interpolation: points are grouped in tiles of `_tile` cells, and
+  # the spline prefilter is only run on a window around the points of each
+  # tile. the window is padded by `_margin` cells beyond the spline support,
+  # the error of the prefilter at the window edge decays as ~0.27**_margin.
+  _tile   = 512
+  _margin = 16
+
+  def _index (self, x, y, out = None, level = 0):
+    """
+    Returns fractional (row, column) indices into `z` (or the overview at
+    `level`) for UPS coordinates `x` and `y`, optionally written to the arrays
+    in the tuple `out`.
+    """
+    s  = 2**level
+    x0 = -self._x0 - (s - 1) / 2. * self.resolution
+    y0 = -self._y0 - (s - 1) / 2. * self.resolution
+    dx = s * self.resolution
+
+    if out is None:
+      return ((y + y0) / dx, (x + x0) / dx)
+
+    r, c = out
+    np.add (y, y0, out = r)
+    r /= dx
+    np.add (x, x0, out = c)
+    c /= dx
+
+    return (r, c)
+
+  @staticmethod
+  def _zorder (r, c):
+    """
+    Returns the permutation that sorts the fractional indices `r` and `c` along
+    a Z-order (Morton) curve over the grid cells, so that points close on the
+    grid are close in the sorted order.
+    """
+    def spread (v):
+      # interleave the lower 16 bits with zeros, non-finite points (which
+      # are outside) go to the edges
+      v = np.nan_to_num (v, nan = 0., posinf = 0xffff, neginf = 0.)
+      v = np.clip (v, 0, 0xffff).astype (np.uint32)
+      v = (v | (v << 8)) & 0x00ff00ff
+      v = (v | (v << 4)) & 0x0f0f0f0f
+      v = (v | (v << 2)) & 0x33333333
+      v = (v | (v << 1)) & 0x55555555
+      return v
+
+    return np.argsort ((spread (r) << 1) | spread (c), kind = 'stable')
+
+  def _map_index (self, r, c, order, window = False, output = None, sort = False, level = 0):
+    """
+    Interpolate `z` (or the overview at `level`) at fractional indices `r` and
+    `c` (see `map_depth`), optionally writing the result to `output`.
+    """
+    if sort and not window:
+      p = self._zorder (r, c)
+      d = self._map_index (r[p], c[p], order, level = level)
+
+      if output is None:
+        output = np.empty (r.shape)
+
+      output[p] = d
+      return output
+
+    if window:
+      d = self._map_window (r, c, order, level)
+      if output is None:
+        return d
+
+      output[...] = d
+      return output
+
+    if order == 0:
+      return self._nearest (self._level (level), r, c, output)
+    elif order == 1:
+      return self._bilinear (self._level (level), r, c, output)
+
+    from scipy.ndimage import map_coordinates
+    a = self._level (level)
+    k = self.coefficients (order, level)
+    if k.shape == a.shape:
+      return map_coordinates (k, [r, c], output = output, cval = np.nan,
+                              order = order, prefilter = False)
+
+    # the coefficients of a subset are padded, points outside the window are
+    # nan as for the full grid
+    pt, _, pl, _ = self._padding (self._margin + order)
+    inside = self._inside (a, r, c)
+    output = self._output (r, output, inside)
+    if inside is not None:
+      r, c = r[inside], c[inside]
+
+    d = map_coordinates (k, [r + pt, c + pl], cval = np.nan, order = order, prefilter = False)
+
+    if inside is None:
+      output[...] = d
+    else:
+      output.reshape (-1)[inside] = d
+
+    return output
+
+  ## kernels for order 0 and 1
+  #
+  # these index `a` directly, equal to `map_coordinates` with `cval = np.nan`:
+  # points outside [0, n - 1] are nan and nearest rounds halves up.
+
+  @staticmethod
+  def _inside (a, r, c):
+    """
+    Returns the positions of the points in `a`, or `None` if all are inside.
+    """
+    ny, nx = a.shape
+    m = (r >= 0) & (r <= ny - 1) & (c >= 0) & (c <= nx - 1)
+    return None if m.all () else np.flatnonzero (m)
+
+  @staticmethod
+  def _output (r, output, inside):
+    if output is None:
+      output = np.empty (r.shape)
+
+    if inside is not None:
+      output[...] = np.nan
+
+    return output
+
+  @staticmethod
+  def _nearest_index (shape, r, c):
+    """
+    Flat index into a grid of `shape` of the nearest cell to `r` and `c`
+    (which must be inside).
+    """
+    k  = np.floor (r + .5).astype (np.intp)
+    k *= shape[1]
+    k += np.floor (c + .5).astype (np.intp)
+    return k
+
+  @staticmethod
+  def _bilinear_index (shape, r, c):
+    """
+    Flat index into a grid of `shape` of the upper left cell of the four
+    cells around `r` and `c` (which must be inside), and the fractions
+    towards the next row and column.
+    """
+    ny, nx = shape
+
+    # the last row and column are reached with a weight of 1 on the
+    # cell before
+    r0 = np.minimum (np.floor (r), max (ny - 2, 0))
+    c0 = np.minimum (np.floor (c), max (nx - 2, 0))
+
+    k  = r0.astype (np.intp)
+    k *= nx
+    k += c0.astype (np.intp)
+
+    return k, r - r0, c - c0
+
+  @classmethod
+  def _nearest (cls, a, r, c, output = None):
+    """
+    Nearest neighbour of `a` at fractional indices `r` and `c`.
+    """
+    inside = cls._inside (a, r, c)
+    output = cls._output (r, output, inside)
+    if inside is not None:
+      r, c = r[inside], c[inside]
+
+    d = a.reshape (-1).take (cls._nearest_index (a.shape, r, c))
+
+    if inside is None:
+      output[...] = d
+    else:
+      output.reshape (-1)[inside] = d
+
+    return output
+
+  @classmethod
+  def _bilinear (cls, a, r, c, output = None):
+    """
+    Bilinear interpolation of `a` at fractional indices `r` and `c`.
+    """
+    inside = cls._inside (a, r, c)
+    output = cls._output (r, output, inside)
+    if inside is not None:
+      r, c = r[inside], c[inside]
+
+    nx = a.shape[1]
+    k, fr, fc = cls._bilinear_index (a.shape, r, c)
+
+    v = a.reshape (-1)
+    g = lambda k: v.take (k).astype (np.float64, copy = False)
+
+    top = g (k)
+    top = top + (g (k + 1) - top) * fc
+    k  += nx
+    bot = g (k)
+    bot = bot + (g (k + 1) - bot) * fc
+
+    d = top + (bot - top) * fr
+
+    if inside is None:
+      output[...] = d
+    else:
+      output.reshape (-1)[inside] = d
+
+    return output
+
+  def _group_tiles (self, r, c, tile, shape):
+    """
+    Group indices `r` and `c` (inside a grid of `shape`) by tiles of `tile`
+    cells.
+
+    Yields:
+      ((tr, tc), k): tile row and column, and the positions of the points in
+                     that tile.
+    """
+    ny, nx = shape
+    nty = (ny + tile - 1) // tile
+    ntx = (nx + tile - 1) // tile
+
+    tr = np.minimum (r // tile, nty - 1).astype (np.intp)
+    tc = np.minimum (c // tile, ntx - 1).astype (np.intp)
+    key = tr * ntx + tc
+
+    srt = np.argsort (key, kind = 'stable')
+    _, start = np.unique (key[srt], return_index = True)
+
+    for k in np.split (srt, start[1:]):
+      if len(k) > 0:
+        yield (tr[k[0]], tc[k[0]]), k
+
+  def _map_window (self, r, c, order, level = 0):
+    """
+    Interpolate `z` at indices `r` and `c` tile by tile, prefiltering only a
+    window around the points in each tile.
+    """
+    from scipy.ndimage import map_coordinates, spline_filter
+
+    a = self._level (level)
+    d = np.full (r.shape, np.nan)
+    ny, nx = a.shape
+
+    inside = np.flatnonzero ((r >= 0) & (r <= ny - 1) & (c >= 0) & (c <= nx - 1))
+    ri = r[inside]
+    ci = c[inside]
+
+    # windows of a subset reach into the grid around it
+    m = self._margin + order
+    pt, pb, pl, pr = self._padding (m) if level == 0 else (0, 0, 0, 0)
+
+    for _, k in self._group_tiles (ri, ci, self._tile, a.shape):
+      rk = ri[k]
+      ck = ci[k]
+
+      r0 = max (-pt, int (rk.min ()) - m)
+      r1 = min (ny + pb, int (rk.max ()) + m + 2)
+      c0 = max (-pl, int (ck.min ()) - m)
+      c1 = min (nx + pr, int (ck.max ()) + m + 2)
+
+      w = self._region (r0, r1, c0, c1, beyond = True) if level == 0 else a[r0:r1, c0:c1]
+      if order > 1:
+        w = spline_filter (w, order, output = np.float64, mode = 'constant')
+
+      d[inside[k]] = map_coordinates (w, [rk - r0, ck - c0], cval = np.nan,
+                                      order = order, prefilter = False)
+
+    return d
+
+  def map_depth (self, x, y, order = 3, window = False, chunk_size = None, workers = None, sort = False, level = 0):
+    """
+    Map coordinates `x` and `y` onto `z` in order to retrieve depth using
+    `scipy.ndimage.map_coordinates`.
+
+    The spline coefficients are cached (see `coefficients`), so only the first
+    call pays for the prefilter over the full grid. For `order` 0 (nearest) and
+    1 (bilinear) no prefilter is needed, and `z` is indexed directly rather
+    than through `map_coordinates`, which is several times faster.
+
+    With `window` the points are grouped in tiles, and the prefilter is only run
+    on a window (with margin) around the points in each tile. The cost then
+    scales with the area covered by the points rather than the full grid,
+    which is faster for few or clustered points. The results are equal to the
+    full grid interpolation within numerical precision.
+
+    Args:
+      x: (array) coordinates (longitude) in meters on UPS
+      y: (array) coordinates (latitude)  in meters on UPS, broadcastable
+         with `x` (e.g. from `grid` with `sparse`)
+      order: spline order (default 3)
+      window: interpolate on windows around the points (default False)
+      chunk_size: process the points in chunks of this size, so that the
+                  temporary index arrays do not grow with the number of
+                  points (default: all at once, or chunks of `_chunk` points
+                  if `x` and `y` broadcast to a larger shape). For arrays
+                  with more than one dimension the chunks are blocks along
+                  the first axis. See also `iter_depth`.
+      workers: split the points across this many threads (see `Sampler`)
+      sort: evaluate the points in Z-order of the grid cells and put the
+            results back in the input order, this avoids jumping around in
+            `z` for unordered points (default False). With `chunk_size` each
+            chunk is sorted separately, `window` already groups the points.
+      level: interpolate on the mean overview at `level` rather than the full
+             grid (see `overview`), default 0 is the full grid.
+
+
+    points outside the map are set to `np.nan`.
+
+    Returns:
+      z: depths along x and y.
+
+    Example: Get points along great circle:
+
+    >>> start = [10, 78]    # positions in degrees
+    >>> end   = [-18, 76]
+    >>>
+    >>> ## Sample a great circle between the two points using the pyproj.Geod set up by the IBCAO class
+    >>> i  = IBCAO ()
+    >>> gc = np.array(i.get_geod ().npts (start[0], start[1], end[0], end[1], 100))
+    >>>
+    >>> ## Interpolate the depth along the great circle
+    >>> gc_xy = i.ups.transform_points (i.g, gc[:,0], gc[:,1]) # convert to UPS coordinates
+    >>> depth = i.map_depth (gc_xy[:,0], gc_xy[:,1])
+    """
+    # this is faster, use if possible
+    if workers is not None and workers > 1:
+      with _sibling ('sampler').Sampler (self, workers) as s:
+        return s.map_depth (x, y, order, window, sort, level)
+
+    return self._map_points (x, y, lambda r, c, output = None:
+                               self._map_index (r, c, order, window, output = output,
+                                                sort = sort, level = level),
+                             chunk_size, level)
+
+  def _map_points (self, x, y, fn, chunk_size = None, level = 0):
+    """
+    Evaluate `fn (r, c, output = None)` at the flattened fractional indices of
+    the points `x` and `y`, optionally in chunks of `chunk_size` points (see
+    `map_depth`). Inputs that broadcast to a larger shape (e.g. from a sparse
+    `grid`) are processed in chunks of `_chunk` points by default, so that
+    they are only expanded one chunk at the time.
+    """
+    x, y = np.asarray (x, dtype = np.float64), np.asarray (y, dtype = np.float64)
+    n = max (x.size, y.size)
+    x, y = np.broadcast_arrays (x, y)
+
+    if chunk_size is None and x.size > n:
+      chunk_size = self._chunk
+
+    if chunk_size is None or chunk_size >= x.size or x.ndim == 0:
+      r, c = self._index (x, y, level = level)
+      return fn (r.ravel (), c.ravel ()).reshape (x.shape)
+
+    d = np.empty (x.shape)
+    n = 0
+
+    for s in self._blocks (x.shape, chunk_size):
+      if n == 0:
+        n  = x[s].size
+        br = np.empty (n)
+        bc = np.empty (n)
+
+      m = x[s].size
+      r, c = self._index (x[s], y[s], out = (br[:m].reshape (x[s].shape), bc[:m].reshape (x[s].shape)), level = level)
+      fn (r.ravel (), c.ravel (), output = d[s].reshape (-1))
+
+    return d
+
+  @staticmethod
+  def _blocks (shape, n):
+    """
+    Split arrays of `shape` in blocks along the first axis of at most `n`
+    elements (at least one row).
+
+    Yields:
+      slice
+    """
+    row = int (np.prod (shape[1:]))
+    b   = max (1, n // max (1, row))
+
+    for i0 in range (0, shape[0], b):
+      yield slice (i0, min (i0 + b, shape[0]))
+
+  def iter_depth (self, chunks, method = 'map', order = 3, window = False):
+    """
+    Retrieve depths for a stream of points.
+
+    Args:
+      chunks: iterable of (x, y) pairs of arrays with UPS coordinates in
+              meters, e.g. read piecewise from a file.
+      method: 'map' (default) uses `map_depth`, 'interp' uses `interp_depth`.
+      order: spline order for 'map' (default 3)
+      window: use windowed interpolation for 'map' (see `map_depth`)
+
+    Yields:
+      z: depths for each chunk, in the same order as the input.
+
+    Memory use is bounded by the size of the chunks, large chunks are further
+    split in `map_depth`.
+
+    >>> i = IBCAO ()
+    >>> for d in i.iter_depth ((c['x'], c['y']) for c in reader):
+    ...   write (d)
+    """
+    if method not in ('map', 'interp'):
+      raise ValueError ("method must be 'map' or 'interp'")
+
+    for x, y in chunks:
+      if method == 'map':
+        yield self.map_depth (x, y, order, window, chunk_size = self._chunk)
+      else:
+        yield self.interp_depth (x, y)
+
+  # number of points processed at the time by the chunked functions
+  _chunk = 65536
+
+  def depth_at (self, lon, lat, method = 'map', order = 3, window = False, out = None):
+    """
+    Retrieve depth at longitude and latitude.
+
+    The points are processed in chunks, for each chunk the points are
+    transformed to UPS (see `lonlat_to_xy`) and interpolated in buffers that
+    are reused, avoiding intermediate arrays of the full size.
+
+    Args:
+      lon: (array) longitude in degrees
+      lat: (array) latitude in degrees, broadcastable with `lon`
+      method: 'map' (default) uses `map_depth`, 'interp' uses `interp_depth`.
+      order: spline order for 'map' (default 3)
+      window: use windowed interpolation for 'map' (see `map_depth`)
+      out: optional float64 array with the broadcast shape of `lon` and
+           `lat` that the depths are written to.
+
+    points outside the map are set to `np.nan`.
+
+    Returns:
+      z: depths with the shape of `lon` and `lat`.
+
+    Example: Get points along great circle:
+
+    >>> i  = IBCAO ()
+    >>> gc = np.array (i.geod.npts (10, 78, -18, 76, 100))
+    >>> depth = i.depth_at (gc[:,0], gc[:,1])
+    """
+    if method not in ('map', 'interp'):
+      raise ValueError ("method must be 'map' or 'interp'")
+
+    lon, lat = np.broadcast_arrays (np.asarray (lon, dtype = np.float64),
+                                    np.asarray (lat, dtype = np.float64))
+
+    if out is None:
+      out = np.empty (lon.shape)
+    elif out.shape != lon.shape or out.dtype != np.float64 or not out.flags.c_contiguous:
+      raise ValueError ("out must be a contiguous float64 array of shape %s" % (lon.shape,))
+
+    if lon.ndim == 0:
+      lon = lon.reshape (1)
+      lat = lat.reshape (1)
+
+    bx = by = None
+
+    # blocks along the first axis, so broadcast inputs (e.g. from a sparse
+    # grid) are only expanded one block at the time
+    for s in self._blocks (lon.shape, self._chunk):
+      m = lon[s].size
+      if bx is None:
+        bx = np.empty (m)
+        by = np.empty (m)
+
+      x, y = self.lonlat_to_xy (lon[s].ravel (), lat[s].ravel (), out = (bx[:m], by[:m]))
+      d = out.reshape (lon.shape)[s].reshape (-1)
+
+      if method == 'map':
+        r, c = self._index (x, y, out = (y, x))
+        self._map_index (r, c, order, window, output = d)
+      else:
+        d[...] = self.interp_depth (x, y)
+
+    return out
+
+  ## derived fields
+  def _field (self, name, shape, dtype, fill):
+    """
+    Derived field `name` of `shape` and `dtype`, computed by `fill (a)` on
+    first use and kept for later calls. With `persist` enabled it is written
+    to a `.npy` sidecar and memory-mapped, which later instances reuse.
+    """
+    dtype = np.dtype (dtype)
+
+    with self._lock:
+      a = self._fields.get (name)
+      if a is None:
+        a = self._load_sidecar (name, shape)
+
+        if a is None or a.dtype != dtype:
+          if self.persist:
+            a = self._write_sidecar (name, shape, dtype, fill)
+          else:
+            a = np.empty (shape, dtype = dtype)
+            fill (a)
+
+        self._fields[name] = a
+
+    return a
+
+  ## land and sea
+  def ocean_mask (self):
+    """
+    Bit-packed mask of the ocean cells (`z` <= 0) of the grid, packed along
+    the rows with `np.packbits` (one bit per cell, 17 MB for the full grid).
+    The mask is computed in bands of rows on first use and kept, see
+    `persist` for keeping it on disk. Cells without data are not ocean.
+
+    Returns:
+      uint8 array of shape (ny, ceil (nx / 8)), unpack with
+      `np.unpackbits (m, axis = 1, count = nx)`.
+    """
+    ny, nx = self.z.shape
+
+    def fill (m):
+      print ("ibcao: computing ocean mask..")
+      band = max (1, 16 * self._chunk // nx)
+      for i0 in range (0, ny, band):
+        i1 = min (i0 + band, ny)
+        m[i0:i1] = np.packbits (self._region (i0, i1, 0, nx) <= 0, axis = 1)
+
+    return self._field ('ocean', (ny, -(-nx // 8)), np.uint8, fill)
+
+  def is_ocean (self, x, y):
+    """
+    Whether the points `x` and `y` are in ocean cells (see `ocean_mask`), by a
+    lookup of the nearest cell in the bit-packed mask.
+
+    Args:
+      x: (array) UPS coordinates in meters
+      y: (array) UPS coordinates in meters, broadcastable with `x`
+
+    Returns:
+      bool array, points outside the grid are not ocean.
+    """
+    m = self.ocean_mask ()
+
+    x, y = np.broadcast_arrays (np.asarray (x, dtype = np.float64),
+                                np.asarray (y, dtype = np.float64))
+    r, c = self._index (x, y)
+    r = r.ravel ()
+    c = c.ravel ()
+
+    inside = self._inside (self.z, r, c)
+    o = np.zeros (r.shape, dtype = bool)
+    if inside is not None:
+      r, c = r[inside], c[inside]
+
+    # byte and bit of the nearest cell
+    k  = np.floor (r + .5).astype (np.intp)
+    k *= m.shape[1]
+    c  = np.floor (c + .5).astype (np.intp)
+    k += c >> 3
+    b  = m.reshape (-1).take (k)
+    b >>= (7 - (c & 7)).astype (np.uint8)
+    b &= 1
+
+    if inside is None:
+      o[...] = b
+    else:
+      o[inside] = b
+
+    return o.reshape (x.shape)
+
+  def coast_distance (self):
+    """
+    Raster with the distance on the map (in meters) from each ocean cell to
+    the nearest land cell (see `ocean_mask`), 0 on land and inf if there is no
+    land in the grid. For a subset land outside its window is included.
+
+    The raster is computed on first use with the Euclidean feature transform
+    of `scipy.ndimage` (which needs about 1.2 GB for the full grid) and
+    converted to distances in bands, see `persist` for keeping it on disk.
+
+    Returns:
+      float32 array with the shape of `z`.
+    """
+    ny, nx = self.z.shape
+    grid = self._padding (max (self._grid.shape))
+
+    def fill (d):
+      from scipy.ndimage import distance_transform_edt
+
+      band = max (1, 16 * self._chunk // nx)
+
+      # the window of a subset is padded with the grid around it: land
+      # beyond the padding is further away than the padding, so the
+      # distances are exact once they are all shorter. otherwise the padding
+      # is doubled, up to the full grid.
+      p = max (ny, nx)
+      while True:
+        pt, pb, pl, pr = pad = self._padding (p)
+        my, mx = ny + pt + pb, nx + pl + pr
+
+        ocean = np.empty ((my, mx), dtype = bool)
+        for i0 in range (0, my, band):
+          i1 = min (i0 + band, my)
+          ocean[i0:i1] = self._region (i0 - pt, i1 - pt, -pl, nx + pr, beyond = True) <= 0
+
+        if ocean.all ():
+          if pad == grid:
+            d[...] = np.inf
+            return
+
+          p *= 2
+          continue
+
+        print ("ibcao: computing distance to coast..")
+        ft = np.empty ((2, my, mx), dtype = np.int32)
+        distance_transform_edt (ocean, return_distances = False, return_indices = True,
+                                indices = ft)
+        del ocean
+
+        c = np.arange (pl, pl + nx)[np.newaxis, :]
+        for i0 in range (0, ny, band):
+          i1 = min (i0 + band, ny)
+          r  = np.arange (pt + i0, pt + i1)[:, np.newaxis]
+          d[i0:i1] = self.resolution * np.hypot (r - ft[0, pt + i0:pt + i1, pl:pl + nx],
+                                                 c - ft[1, pt + i0:pt + i1, pl:pl + nx])
+        del ft
+
+        if pad == grid or d.max () <= p * self.resolution:
+          return
+
+        p *= 2
+
+    return self._field ('coast', (ny, nx), np.float32, fill)
+
+  def distance_to_coast (self, x, y):
+    """
+    Distance from the points `x` and `y` to the coast, interpolated
+    (bilinear) from `coast_distance` and scaled to true distance with the
+    point scale of the projection at the point.
+
+    Args:
+      x: (array) UPS coordinates in meters
+      y: (array) UPS coordinates in meters, broadcastable with `x`
+
+    Returns:
+      distance in meters, 0 on land (see `is_ocean`), nan outside the grid
+      (or subset) and inf if there is no land in the grid.
+    """
+    d = self.coast_distance ()
+
+    x, y = np.broadcast_arrays (np.asarray (x, dtype = np.float64),
+                                np.asarray (y, dtype = np.float64))
+    r, c = self._index (x, y)
+
+    if np.isinf (d[0, 0]):
+      # no land
+      o = np.where (np.isnan (self._nearest (d, r.ravel (), c.ravel ())), np.nan, np.inf)
+    else:
+      o = self._bilinear (d, r.ravel (), c.ravel ())
+      o /= self._scale_table () (np.hypot (x, y).ravel ())
+
+      # the interpolation reaches over the coast
+      o[~self.is_ocean (x, y).ravel () & ~np.isnan (o)] = 0.
+
+    return o.reshape (x.shape)
+
+  ## terrain
+  #
+  # the terrain fields are computed in bands of rows, each read with a halo of
+  # cells on every side so that the bands join without seams. the halo of a
+  # subset reaches into the grid around it, so the fields equal those of the
+  # full grid. at the edges of the grid the differences are one-sided.
+
+  def _terrain (self, name, halo, fn):
+    """
+    Float32 field `name` with the shape of `z`, computed on first use by
+    `fn (w, r0, c0)` on bands `w` of `z` with up to `halo` extra cells on
+    every side, starting at row `r0` and column `c0` (negative in the grid
+    before the window of a subset), see `_field`.
+    """
+    ny, nx = self.z.shape
+    pt, pb, pl, pr = self._padding (halo)
+
+    def fill (a):
+      print ("ibcao: computing %s.." % name)
+      band = max (1, 16 * self._chunk // nx)
+      for i0 in range (0, ny, band):
+        i1 = min (i0 + band, ny)
+        h0 = max (-pt, i0 - halo)
+        w  = np.asarray (self._region (h0, min (ny + pb, i1 + halo), -pl, nx + pr, beyond = True),
+                         dtype = np.float32)
+        a[i0:i1] = fn (w, h0, -pl)[i0 - h0:i1 - h0, pl:pl + nx]
+
+    return self._field (name, (ny, nx), np.float32, fill)
+
+  def _band_axes (self, w, r0, c0):
+    """
+    Coordinates of the columns (1, n) and rows (m, 1) of the band `w`
+    starting at row `r0` and column `c0`.
+    """
+    x = self._x0 + np.arange (c0, c0 + w.shape[1])[np.newaxis, :] * self.resolution
+    y = self._y0 + np.arange (r0, r0 + w.shape[0])[:, np.newaxis] * self.resolution
+    return (x, y)
+
+  def _gradient (self, w, r0, c0, scale):
+    """
+    Gradient of the band `w` (starting at row `r0` and column `c0`) along x
+    and y in true meters, i.e. scaled by the point scale `scale (rho)` of
+    every cell.
+    """
+    gy, gx = np.gradient (w, self.resolution)
+
+    x, y = self._band_axes (w, r0, c0)
+    k = scale (np.hypot (x, y)).astype (np.float32)
+    gx *= k
+    gy *= k
+
+    return (gx, gy)
+
+  def slope (self):
+    """
+    Slope of the seafloor (and land) in degrees, from central differences
+    of `z` over the true distance between the cells (the grid spacing divided
+    by the point scale of the projection).
+
+    The slope is computed in bands on first use and kept, see `persist` for
+    keeping it on disk. Sample it at points with `map_field`.
+
+    Returns:
+      float32 array with the shape of `z`.
+    """
+    scale = self._scale_table ()
+
+    def fn (w, r0, c0):
+      gx, gy = self._gradient (w, r0, c0, scale)
+      return np.degrees (np.arctan (np.hypot (gx, gy)))
+
+    return self._terrain ('slope', 1, fn)
+
+  def aspect (self):
+    """
+    Aspect of the seafloor (and land): the compass direction the slope faces
+    (downhill), in degrees clockwise from true north. North is towards the
+    pole, so the grid directions are rotated by the longitude of every cell.
+    Flat cells are nan.
+
+    The aspect is computed in bands on first use and kept, see `persist` for
+    keeping it on disk. Sample it at points with `map_field`.
+
+    Returns:
+      float32 array with the shape of `z`.
+    """
+    scale = self._scale_table ()
+
+    def fn (w, r0, c0):
+      gx, gy = self._gradient (w, r0, c0, scale)
+
+      # north is (-x, -y) and east is (-y, x), the downhill direction is
+      # (-gx, -gy).
+      x, y = self._band_axes (w, r0, c0)
+      x = x.astype (np.float32)
+      y = y.astype (np.float32)
+
+      a = np.degrees (np.arctan2 (gx * y - gy * x, gx * x + gy * y))
+      a %= 360.
+      a[(gx == 0) & (gy == 0)] = np.nan
+
+      return a
+
+    return self._terrain ('aspect', 1, fn)
+
+  def roughness (self, window = 3):
+    """
+    Roughness of the seafloor (and land): the difference between the
+    largest and the smallest `z` in a window of `window` x `window` cells
+    around each cell (Wilson et al., 2007), in meters.
+
+    The roughness is computed in bands on first use and kept (for each
+    `window`), see `persist` for keeping it on disk. Sample it at points with
+    `map_field`.
+
+    Args:
+      window: size of the window in cells, odd (default 3)
+
+    Returns:
+      float32 array with the shape of `z`.
+    """
+    if int (window) != window or window < 3 or window % 2 != 1:
+      raise ValueError ("window must be an odd number of cells >= 3")
+
+    window = int (window)
+
+    def fn (w, r0, c0):
+      from scipy.ndimage import maximum_filter, minimum_filter
+      return maximum_filter (w, window, mode = 'nearest') - minimum_filter (w, window, mode = 'nearest')
+
+    return self._terrain ('roughness%d' % window, window // 2, fn)
+
+  def curvature (self):
+    """
+    Curvature of the seafloor (and land): the Laplacian of `z` (the sum of
+    the second derivatives along x and y) over the true distance between the
+    cells, in 1/m. Positive in hollows and channels, negative on ridges and
+    peaks.
+
+    The curvature is computed in bands on first use and kept, see `persist`
+    for keeping it on disk. Sample it at points with `map_field`.
+
+    Returns:
+      float32 array with the shape of `z`.
+    """
+    scale = self._scale_table ()
+
+    def fn (w, r0, c0):
+      from scipy.ndimage import laplace
+
+      x, y = self._band_axes (w, r0, c0)
+      k = scale (np.hypot (x, y)).astype (np.float32)
+
+      l  = laplace (w, mode = 'nearest')
+      l *= k**2 / np.float32 (self.resolution**2)
+      return l
+
+    return self._terrain ('curvature', 1, fn)
+
+  _terrain_fields = ('slope', 'aspect', 'roughness', 'curvature')
+
+  def map_field (self, x, y, field, order = None, chunk_size = None, workers = None):
+    """
+    Sample a field on the grid, e.g. `slope`, at the coordinates `x` and `y`,
+    like `map_depth` does for `z`.
+
+    Args:
+      x: (array) UPS coordinates in meters
+      y: (array) UPS coordinates in meters, broadcastable with `x`
+      field: 'slope', 'aspect', 'roughness' (window of 3 cells),
+             'curvature', or an array with the shape of `z` (e.g. from
+             `roughness` with another window)
+      order: 0 (nearest) or 1 (bilinear), default 1, and 0 for 'aspect'
+             since the directions wrap around
+      chunk_size: process the points in chunks of this size (see
+                  `map_depth`)
+      workers: split the points across this many threads (see `Sampler`)
+
+    Returns:
+      the field at the points, nan outside the grid.
+    """
+    if isinstance (field, str):
+      if field not in self._terrain_fields:
+        raise ValueError ("field must be one of: %s" % ', '.join (self._terrain_fields))
+
+      if order is None and field == 'aspect':
+        order = 0
+
+    elif field.shape != self.z.shape:
+      raise ValueError ("field must have the shape of z: %s" % (self.z.shape,))
+
+    if order is None:
+      order = 1
+
+    if order not in (0, 1):
+      raise ValueError ("order must be 0 or 1")
+
+    if workers is not None and workers > 1:
+      with _sibling ('sampler').Sampler (self, workers) as s:
+        return s.map_field (x, y, field, order)
+
+    a = getattr (self, field) () if isinstance (field, str) else field
+    k = self._nearest if order == 0 else self._bilinear
+
+    return self._map_points (x, y, lambda r, c, output = None: k (a, r, c, output),
+                             chunk_size)
+
+  ## zonal statistics
+  #
+  # polygons are rasterized by even-odd crossings: for every row of cell
+  # centers the crossings of the polygon edges are counted into the first cell
+  # to the right of the crossing, and a cumulative sum along the row gives the
+  # number of crossings to the left of every cell, which is odd inside.
+
+  _zonal_stats = ('count', 'mean', 'min', 'max', 'area', 'hist')
+
+  @staticmethod
+  def _rings (polygon):
+    """
+    Returns the rings of `polygon` as a list of (n, 2) arrays.
+    """
+    if hasattr (polygon, 'geoms'):
+      return [ r for p in polygon.geoms for r in IBCAO._rings (p) ]
+
+    if hasattr (polygon, 'exterior'):
+      return [ np.asarray (r.coords)[:, :2] for r in [ polygon.exterior ] + list (polygon.interiors) ]
+
+    if np.ndim (polygon[0]) == 1:
+      polygon = [ polygon ]
+
+    return [ np.asarray (r, dtype = np.float64) for r in polygon ]
+
+  def _crossings (self, rings):
+    """
+    Crossings of the edges of `rings` (UPS coordinates) with the rows of cell
+    centers.
+
+    Returns:
+      (r, c): row and column (the first cell center right of the crossing,
+              or `nx`) of every crossing, sorted by row. `None` if the
+              polygon does not cover any cell centers.
+    """
+    ny, nx = self.z.shape
+    x1 = np.concatenate ([ r[:, 0] for r in rings ])
+    y1 = np.concatenate ([ r[:, 1] for r in rings ])
+    x2 = np.concatenate ([ np.roll (r[:, 0], -1) for r in rings ])
+    y2 = np.concatenate ([ np.roll (r[:, 1], -1) for r in rings ])
+
+    # rows with centers in [min (y1, y2), max (y1, y2)) cross the edge
+    yr = self._y0 + np.arange (ny) * self.resolution
+    ra = np.searchsorted (yr, np.minimum (y1, y2))
+    rb = np.searchsorted (yr, np.maximum (y1, y2))
+    n  = rb - ra
+    if n.sum () == 0:
+      return None
+
+    e = np.repeat (np.arange (len(n)), n)
+    r = np.arange (len(e)) - np.repeat (np.cumsum (n) - n, n) + ra[e]
+
+    y  = yr[r]
+    xc = x1[e] + (y - y1[e]) * (x2[e] - x1[e]) / (y2[e] - y1[e])
+    c  = np.searchsorted (self._x0 + np.arange (nx) * self.resolution, xc, side = 'right')
+
+    k = np.argsort (r, kind = 'stable')
+    return (r[k], c[k])
+
+  def _zonal (self, rings, bins, scale):
+    """
+    Statistics of `z` on the cell centers inside the polygon `rings` (UPS
+    coordinates), see `zonal_stats`.
+    """
+    s = { 'count' : 0, 'sum' : 0., 'area' : 0., 'min' : np.nan, 'max' : np.nan,
+          'hist' : np.zeros (len(bins) - 1) if bins is not None else None }
+
+    rc = self._crossings (rings)
+    if rc is None:
+      return s
+
+    # the cells inside are right of the first and left of the last crossing
+    r, c = rc
+    r0, r1 = r[0], r[-1] + 1
+    c0, c1 = c.min (), c.max ()
+    if c1 <= c0:
+      return s
+
+    x, y = self._axes ()
+    band = max (1, 16 * self._chunk // (c1 - c0))
+    for i0 in range (r0, r1, band):
+      i1 = min (i0 + band, r1)
+      k0, k1 = np.searchsorted (r, [i0, i1])
+
+      # crossings to the left of every cell, odd inside
+      t = np.bincount ((r[k0:k1] - i0) * (c1 - c0 + 1) + (c[k0:k1] - c0),
+                       minlength = (i1 - i0) * (c1 - c0 + 1))
+      t = t.reshape (i1 - i0, c1 - c0 + 1)[:, :-1]
+      m = (np.cumsum (t, axis = 1) & 1).astype (bool)
+
+      w  = np.asarray (self._region (i0, i1, c0, c1))
+      m &= ~np.isnan (w)
+      zz = w[m].astype (np.float64)
+
+      if len(zz) == 0:
+        continue
+
+      # true area of the cells
+      a  = np.hypot (x[np.newaxis, c0:c1], y[i0:i1, np.newaxis])[m]
+      a  = self.resolution**2 / scale (a)**2
+
+      s['count'] += len(zz)
+      s['sum']   += np.dot (zz, a)
+      s['area']  += a.sum ()
+      s['min']    = np.fmin (s['min'], zz.min ())
+      s['max']    = np.fmax (s['max'], zz.max ())
+
+      if bins is not None:
+        # as np.histogram, the last bin includes its right edge
+        nb = len(bins) - 1
+        b  = np.searchsorted (bins, zz, side = 'right') - 1
+        b[zz == bins[-1]] = nb - 1
+        v  = (b >= 0) & (b < nb)
+        s['hist'] += np.bincount (b[v], weights = a[v], minlength = nb)
+
+    return s
+
+  def zonal_stats (self, polygons, stats = None, bins = None, lonlat = True, workers = None):
+    """
+    Statistics of `z` within polygons.
+
+    Each polygon is rasterized (the cells with their centers inside, by the
+    even-odd rule) only within its bounding window, in bands of rows which
+    are read from `z` (or the tiles, see `convert`). The area of the cells
+    is their true area on the ellipsoid (see `point_scale`).
+
+    Args:
+      polygons: sequence of polygons, each an (n, 2) array of vertices, a
+                list of such rings (e.g. an exterior and holes), or a
+                shapely (multi-)polygon.
+      stats: list of statistics (default: all, 'hist' only with `bins`):
+             'count': number of cells,
+             'mean': area weighted mean of `z`,
+             'min', 'max': extremes of `z`,
+             'area': area in square meters,
+             'hist': area (square meters) with `z` in each of the bins.
+      bins: edges of the bins of `z` (elevation, negative below sea level)
+            for 'hist', as for `np.histogram`.
+      lonlat: vertices are longitude and latitude in degrees (default True),
+              otherwise UPS coordinates in meters. The edges are straight
+              lines on the UPS map, so long edges should be densified.
+      workers: process the polygons on a pool of this many threads.
+
+    Returns:
+      dict of arrays with a value for every polygon (nan for 'mean', 'min'
+      and 'max' without any cells), 'hist' has shape
+      (len (polygons), len (bins) - 1).
+
+    >>> i = IBCAO ()
+    >>> s = i.zonal_stats ([ [(0, 80), (20, 80), (20, 82), (0, 82)] ],
+    ...                    bins = [ -5000, -1000, -200, 0 ])
+    """
+    if stats is None:
+      stats = [ s for s in self._zonal_stats if s != 'hist' or bins is not None ]
+
+    for s in stats:
+      if s not in self._zonal_stats:
+        raise ValueError ("stats must be of: %s" % ', '.join (self._zonal_stats))
+
+    if 'hist' in stats and bins is None:
+      raise ValueError ("bins are needed for 'hist'")
+
+    if bins is not None:
+      bins = np.asarray (bins, dtype = np.float64)
+
+    def rings (p):
+      rr = self._rings (p)
+      if lonlat:
+        rr = [ np.stack (self.lonlat_to_xy (r[:, 0], r[:, 1]), axis = -1) for r in rr ]
+
+      return rr
+
+    scale = self._scale_table ()
+    zonal = lambda p: self._zonal (rings (p), bins, scale)
+
+    if workers is not None and workers > 1:
+      from concurrent.futures import ThreadPoolExecutor
+      with ThreadPoolExecutor (workers) as pool:
+        zs = list (pool.map (zonal, polygons))
+    else:
+      zs = [ zonal (p) for p in polygons ]
+
+    out = {}
+    for s in stats:
+      if s == 'mean':
+        out[s] = np.array ([ z['sum'] / z['area'] if z['count'] else np.nan for z in zs ])
+      elif s == 'count':
+        out[s] = np.array ([ z['count'] for z in zs ], dtype = np.int64)
+      elif s == 'hist':
+        out[s] = np.array ([ z['hist'] for z in zs ]).reshape (len(zs), len(bins) - 1)
+      else:
+        out[s] = np.array ([ z[s] for z in zs ], dtype = np.float64)
+
+    return out
+
+  ## isobaths
+  #
+  # the isobath at a depth is indexed by its contour vertices: for every pair
+  # of neighbouring cells on either side of the depth the crossing is
+  # interpolated along the edge between them. the vertices are kept in a k-d
+  # tree, together with the deeper cell of the pair.
+
+  def _isobath (self, depth):
+    """
+    Returns the k-d tree of the contour vertices of the isobath at `depth`
+    (positive meters), and the flat index into the full grid of the deeper
+    cell of each vertex.
+
+    A subset uses the index of its full instance, so that the isobath outside
+    its window is found as well.
+    """
+    from scipy.spatial import cKDTree
+
+    if self._parent is not None:
+      return self._parent._isobath (depth)
+
+    depth = float (depth)
+
+    with self._lock:
+      iso = self._isobaths.get (depth)
+      if iso is None:
+        name = 'isobath_%g' % depth
+        v = self._load_sidecar (name, None)
+
+        if v is None:
+          print ("ibcao: indexing isobath at %g m.." % depth)
+          v = self._contour (-depth)
+
+          if self.persist:
+            v = self._save_sidecar (name, v)
+
+        iso = (cKDTree (np.asarray (v[:, :2])), np.asarray (v[:, 2], dtype = np.intp))
+        self._isobaths[depth] = iso
+
+    return iso
+
+  def _contour (self, level):
+    """
+    Contour vertices where `z` crosses `level`, scanned in bands of rows.
+
+    Returns:
+      (n, 3) array: x and y (UPS) of the vertices, and the flat index of the
+                    cell of each pair that is below `level`.
+    """
+    ny, nx = self.z.shape
+    res  = self.resolution
+    band = max (1, 16 * self._chunk // nx)
+    out  = []
+
+    for i0 in range (0, ny, band):
+      i1 = min (i0 + band, ny)
+
+      # one more row for the vertical pairs
+      a = np.asarray (self._region (i0, min (i1 + 1, ny), 0, nx), dtype = np.float64)
+      m = a <= level
+      v = ~np.isnan (a)
+
+      pairs = []
+
+      # horizontal pairs (r, c) - (r, c + 1)
+      r, c = np.nonzero ((m[:i1 - i0, :-1] != m[:i1 - i0, 1:]) & v[:i1 - i0, :-1] & v[:i1 - i0, 1:])
+      pairs.append ((r, c, r, c + 1))
+
+      # vertical pairs (r, c) - (r + 1, c)
+      r, c = np.nonzero ((m[:-1] != m[1:]) & v[:-1] & v[1:])
+      pairs.append ((r, c, r + 1, c))
+
+      for r0, c0, r1, c1 in pairs:
+        z0 = a[r0, c0]
+        z1 = a[r1, c1]
+        t  = (z0 - level) / (z0 - z1)
+
+        deep = np.where (m[r0, c0], (i0 + r0) * nx + c0, (i0 + r1) * nx + c1)
+
+        out.append (np.column_stack ((self._x0 + (c0 + t * (c1 - c0)) * res,
+                                      self._y0 + (i0 + r0 + t * (r1 - r0)) * res,
+                                      deep)))
+
+    return np.concatenate (out) if out else np.empty ((0, 3))
+
+  def _query_isobath (self, x, y, depth):
+    """
+    Nearest contour vertex of the isobath at `depth` to `x` and `y`.
+
+    Returns:
+      (x, y, d, k, inside): flattened points, map distance to and index of the
+                            nearest vertex, and whether the points are on the
+                            grid.
+    """
+    tree, _ = self._isobath (depth)
+
+    x, y = np.broadcast_arrays (np.asarray (x, dtype = np.float64),
+                                np.asarray (y, dtype = np.float64))
+    x = x.ravel ()
+    y = y.ravel ()
+
+    inside = (x >= self.xlim[0]) & (x <= self.xlim[1]) & \
+             (y >= self.ylim[0]) & (y <= self.ylim[1])
+
+    if tree.n == 0:
+      return x, y, np.full (x.shape, np.inf), np.full (x.shape, -1), inside
+
+    d, k = tree.query (np.column_stack ((x, y)), workers = -1)
+    return x, y, d, k, inside
+
+  def distance_to_isobath (self, x, y, depth, signed = False):
+    """
+    Distance from the points `x` and `y` to the isobath at `depth`.
+
+    The isobath is indexed once per depth (a scan of the grid in bands, see
+    `persist` for keeping it on disk), after which every query is a k-d tree
+    lookup. The distance is to the nearest contour vertex, where the isobath
+    crosses the edges between cells, and is scaled to true distance with the
+    point scale of the projection at the point.
+
+    Args:
+      x: (array) UPS coordinates in meters
+      y: (array) UPS coordinates in meters, broadcastable with `x`
+      depth: depth of the isobath in meters (positive, e.g. 200)
+      signed: negative distances for points deeper than the isobath
+              (default False)
+
+    Returns:
+      distance in meters, nan outside the grid (and inf if the grid does not
+      reach `depth`).
+    """
+    shape = np.broadcast_shapes (np.shape (x), np.shape (y))
+    x, y, d, _, inside = self._query_isobath (x, y, depth)
+
+    d = d / self._scale_table () (np.hypot (x, y))
+    d[~inside] = np.nan
+
+    if signed:
+      r, c = self._index (x, y)
+      z = self._nearest (self.z, r, c)
+      d[z <= -depth] *= -1
+
+    return d.reshape (shape)
+
+  def nearest_deeper (self, x, y, depth):
+    """
+    Nearest position deeper than `depth` to the points `x` and `y`.
+
+    Uses the index of the isobath at `depth` (see `distance_to_isobath`):
+    points that are already deeper are returned as they are, for the other
+    points the deeper cell next to the nearest contour vertex is returned.
+
+    Args:
+      x: (array) UPS coordinates in meters
+      y: (array) UPS coordinates in meters, broadcastable with `x`
+      depth: depth in meters (positive, e.g. 1000)
+
+    Returns:
+      (x, y, distance): the UPS coordinates of the deeper positions (for a
+                        subset they may be outside its window) and the
+                        distance to them in meters (0 for points that are
+                        already deeper), nan outside the grid or if the grid
+                        does not reach `depth`.
+    """
+    shape = np.broadcast_shapes (np.shape (x), np.shape (y))
+    x, y, d, k, inside = self._query_isobath (x, y, depth)
+    _, cells = self._isobath (depth)
+
+    xd = np.full (x.shape, np.nan)
+    yd = np.full (x.shape, np.nan)
+
+    # cells are in the full grid
+    found = inside & (k >= 0) & (k < cells.size)
+    cell  = cells[k[found]]
+    nx    = self._grid.shape[1]
+    xd[found] = -self.extent + (cell % nx) * self.resolution
+    yd[found] = -self.extent + (cell // nx) * self.resolution
+
+    # points already deeper
+    r, c = self._index (x, y)
+    z = self._nearest (self.z, r, c)
+    deep = inside & (z <= -depth)
+    xd[deep] = x[deep]
+    yd[deep] = y[deep]
+
+    d = np.hypot (xd - x, yd - y) / self._scale_table () (np.hypot (x, y))
+
+    return (xd.reshape (shape), yd.reshape (shape), d.reshape (shape))
+
+  @property
+  def xlim (self):
+    """
+    Extent in longitude coordinates (meters) on UPS projection.
+    """
+    return (self._x0, self._x0 + (self.dim[0] - 1) * self.resolution)
+
+  @property
+  def ylim (self):
+    """
+    Extent in latitude coordinates (meters) on UPS projection.
+    """
+    return (self._y0, self._y0 + (self.dim[1] - 1) * self.resolution)
+
+  @property
+  def imextent(self):
+    return [*self.xlim, *self.ylim]
+
+
+
+  @property
+  def x (self):
+    """
+    `x` (longitude) arguments for depth data (`z`) in meters (UPS).
+    """
+    return self.ups_x.data[self._window[2]:self._window[3]]
+
+  @property
+  def y (self):
+    """
+    `y` (latitude) arguments for depth data (`z`) in meters (UPS).
+    """
+    return self.ups_y.data[self._window[0]:self._window[1]]
+
+  @property
+  def z (self):
+    """
+    Depth data on `grid`. This is the native-endian copy if `native` is
+    enabled, otherwise the big-endian data memory-mapped from the grd file.
+    """
+    r0, r1, c0, c1 = self._window
+    return self._grid[r0:r1, c0:c1]
+
+  @property
+  def _grid (self):
+    """
+    The full grid, regardless of subset.
+    """
+    if self._native is not None:
+      return self._native
+
+    return self._z.data
+
+  def _axes (self, div = 1, level = 0):
+    """
+    Returns the coordinates of every `div` column and row of `z`, or of the
+    overview at `level`.
+    """
+    s  = 2**level
+    x0 = (s - 1) / 2. * self.resolution
+    dx = s * self.resolution
+
+    x = self._x0 + x0 + np.arange (0, -(-self.dim[0] // s), div) * dx
+    y = self._y0 + x0 + np.arange (0, -(-self.dim[1] // s), div) * dx
+    return (x, y)
+
+  def grid (self, div = 1, sparse = False, copy = True):
+    """
+    Create position grid for IBCAO, matching `z[::div, ::div]`.
+
+    The grid is regular, so the full arrays are rarely needed: with `sparse`
+    `x` is returned as a row and `y` as a column, which broadcast against each
+    other, and without `copy` the full arrays are read-only views of these
+    (as `np.meshgrid`). Either way no memory is used for the full grid, and
+    the depth and projection functions accept them as they are. See also
+    `iter_grid`.
+
+    Args:
+      div:  Skip every div point (1 include all, default) corresponds to
+            `div` in `template()`.
+      sparse: return `x` with shape (1, nx) and `y` with shape (ny, 1)
+              (default False)
+      copy: return full arrays, rather than broadcast views (default True)
+
+    Returns:
+      (x, y): A tuple with `x` and `y` grid for `z`.
+    """
+    x, y = self._axes (div)
+    return tuple (np.meshgrid (x, y, sparse = sparse, copy = copy))
+
+  def lonlat (self, div = 1, level = 0, dtype = np.float64):
+    """
+    Longitude and latitude of every `div` cell of `z` (or of the overview at
+    `level`), e.g. for masking by latitude or joining with other data sets.
+
+    The tables are computed in blocks of rows with `xy_to_lonlat`, so the
+    temporary arrays are bounded to about a million points, and kept for
+    later calls. With `persist` enabled they are written (block by block) to
+    a `.npy` sidecar and memory-mapped, which later instances reuse.
+
+    Args:
+      div: Skip every div point (1 include all, default)
+      level: overview level (see `overview`), default 0 is the full grid
+      dtype: dtype of the tables, `np.float32` halves the size (default
+             `np.float64`)
+
+    Returns:
+      (lon, lat): longitude and latitude in degrees with the shape of
+                  `z[::div, ::div]` (or the overview).
+    """
+    dtype = np.dtype (dtype)
+    key   = (div, level, dtype.str)
+
+    with self._lock:
+      t = self._lonlat.get (key)
+      if t is None:
+        x, y  = self._axes (div, level)
+        shape = (2, y.size, x.size)
+        name  = 'lonlat_l%d_d%d_%s' % (level, div, dtype.name)
+        t = self._load_sidecar (name, shape)
+
+        if t is None or t.dtype != dtype:
+          rows = max (1, 16 * self._chunk // x.size)
+          bl = np.empty ((rows, x.size))
+          bt = np.empty ((rows, x.size))
+
+          def fill (t):
+            for i0 in range (0, y.size, rows):
+              i1 = min (i0 + rows, y.size)
+              lon, lat = self.xy_to_lonlat (x[np.newaxis, :], y[i0:i1, np.newaxis],
+                                            out = (bl[:i1 - i0], bt[:i1 - i0]))
+              t[0, i0:i1] = lon
+              t[1, i0:i1] = lat
+
+          print ("ibcao: computing longitude and latitude..")
+          if self.persist:
+            t = self._write_sidecar (name, shape, dtype, fill)
+          else:
+            t = np.empty (shape, dtype = dtype)
+            fill (t)
+
+        self._lonlat[key] = t
+
+    return (t[0], t[1])
+
+  def iter_grid (self, div = 1, rows = None):
+    """
+    Iterate over the position grid (see `grid`) in blocks of rows, e.g. to
+    compute a field for the full grid without the full coordinate arrays.
+
+    Args:
+      div: Skip every div point (1 include all, default)
+      rows: number of rows in each block (default: about a million points)
+
+    Yields:
+      (s, x, y): the slice `s` of the rows of the block, `x` with shape
+                 (1, nx) and `y` with shape (rows, 1).
+
+    >>> i = IBCAO ()
+    >>> lat = np.empty (i.z.shape, dtype = np.float32)
+    >>> for s, x, y in i.iter_grid ():
+    ...   lat[s] = i.xy_to_lonlat (x, y)[1]
+    """
+    x, y = self._axes (div)
+    if rows is None:
+      rows = max (1, 16 * self._chunk // x.size)
+
+    x = x[np.newaxis, :]
+    for i0 in range (0, y.size, rows):
+      i1 = min (i0 + rows, y.size)
+      yield slice (i0, i1), x, y[i0:i1, np.newaxis]
+
+  def Colormap (self):
+    """
+    Returns a discrete colormap and norm based on the official IBCAO colormap.
+
+    Returns:
+      (cmap, norm): A tuple with the colormap and the norm
+
+    Example:
+
+    >>> (cmap, norm) = self.Colormap ()
+    >>> cm = ax.pcolormesh (x, y, z, cmap = cmap, norm = norm)
+    >>> plt.colorbar (cm)
+
+    """
+
+    from matplotlib.colors import ListedColormap, BoundaryNorm
+
+    # loader based on: http://wiki.scipy.org/Cookbook/Matplotlib/Loading_a_colormap_dynamically and
+    #   http://stackoverflow.com/questions/26559764/matplotlib-pcolormesh-discrete-colors
+
+    cmap = np.empty ((0,4))
+    c = 0
+
+    for l in self._COLORMAP.split("\n"):
+      l = l.strip()
+
+      if len(l) == 0 or l[0] == '#':
+        continue
+
+      ls = np.array([float (v) for v in l.split ()])
+
+      if ls.shape[0] < 8:
+        continue
+
+      c += 1
+      cmap.resize (c, 4)
+      cmap[c-1,:] = ls[:4]
+
+    # add end spec
+    c += 1
+    cmap.resize (c, 4)
+    cmap[c-1,:] = ls[4:]
+
+    # normalize colors
+    cmap[:,[1, 2, 3]] = cmap[:,[1, 2, 3]] / 255.
+
+    cmap_out = ListedColormap (cmap[:,1:4], 'ibcao', c)
+    norm     = BoundaryNorm (cmap[:,0], c)
+
+    return (cmap_out, norm)
+
+  def template (self, div = 1, level = None):
+    """
+    Sets up and returns a figure with the IBCAO map loaded, ready for additional plotting:
+
+    Args:
+      div: use every div point in map (1 is default, use all points)
+      level: plot the mean overview at `level` instead (see `overview`), this
+             is faster and avoids aliasing. `div` is ignored.
+
+    Returns:
+      matplotlib Figure
 
     >>> i = IBCAO ()
     >>> f = i.template ()
@@ -401,11 +3050,23 @@ class IBCAO:
     ax.set_ylim (*self.ylim)
 
     ax.coastlines ('10m')
-    ax.gridlines (crs = self.g, ylocs = np.arange (60, 90, 5))
+    # cartopy only supports gridlines in PlateCarree
+    import cartopy.crs as ccrs
+    ax.gridlines (crs = ccrs.PlateCarree (), ylocs = np.arange (60, 90, 5))
+
+    # plot every 'div' data point, or the overview
+    if level is not None:
+      x, y, z = self.overview (level)
+    else:
+      x, y, z = self.x[::div], self.y[::div], self.z[::div, ::div]
+
+    # uniform grid, pass outer edges of the cells
+    dx = x[1] - x[0]
+    dy = y[1] - y[0]
 
-    # plot every 'div' data point
     (cmap, norm) = self.Colormap ()
-    cm = ax.pcolorfast (self.x[::div], self.y[::div], self.z[::div, ::div], cmap = cmap, norm = norm)
+    cm = ax.pcolorfast ((x[0] - dx / 2, x[-1] + dx / 2), (y[0] - dy / 2, y[-1] + dy / 2), z,
+                        cmap = cmap, norm = norm)
     cb = plt.colorbar (cm)
     cb.set_label ('Depth [m]')
 
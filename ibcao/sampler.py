@@ -0,0 +1,163 @@
+#! /usr/bin/env python
+# encoding: utf-8
+#
+# Parallel depth lookup for the IBCAO
+
+import  os
+import  numpy as np
+from    concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+__all__ = [ 'Sampler' ]
+
+# IBCAO instance of a worker process, the grid is memory-mapped so the pages
+# are shared between the processes through the page cache.
+_worker = None
+
+def _init_worker (ibcao_grid, persist, cache_dir, cache_size, native, shared_name, window):
+  global _worker
+  try:
+    from .ibcao import IBCAO
+  except ImportError:
+    from ibcao import IBCAO
+
+  if shared_name is not None:
+    _worker = IBCAO.attach (shared_name, ibcao_grid, persist = persist,
+                            cache_dir = cache_dir, cache_size = cache_size)
+  else:
+    _worker = IBCAO (ibcao_grid, persist = persist, cache_dir = cache_dir,
+                     cache_size = cache_size, native = native)
+
+  # the window of a subset
+  if window is not None:
+    _worker = _worker._view (window)
+
+def _call_worker (fname, args, kwargs):
+  return getattr (_worker, fname) (*args, **kwargs)
+
+class Sampler:
+  """
+  Depth lookup split across a pool of threads or processes.
+
+  The points are split in contiguous chunks that are processed by the
+  workers, the results are put back together in the order of the input.
+
+  With threads (default) the workers share the `IBCAO` instance and its
+  caches, the interpolation in `scipy.ndimage` runs without holding the GIL.
+  With `processes` every worker opens the grid itself; the grid is
+  memory-mapped so it is not copied, but the spline coefficients for
+  `map_depth` are computed by every worker unless they are persisted (see
+  `IBCAO.persist`), or `window` is used. If the instance is shared (see
+  `IBCAO.share`) the workers attach to the shared memory instead. For a
+  subset (see `IBCAO.subset`) the workers use the same window.
+
+  The pool is kept until `close` is called, so the sampler can be reused for
+  many queries.
+
+  Args:
+    ibcao: `IBCAO` instance
+    workers: number of workers (default: number of CPUs)
+    processes: use a process pool rather than a thread pool (default False)
+
+  >>> i = IBCAO ()
+  >>> with Sampler (i, workers = 8) as s:
+  ...   d = s.map_depth (x, y)
+  """
+
+  # minimum number of points per chunk
+  _min_chunk = 4096
+
+  def __init__ (self, ibcao, workers = None, processes = False):
+    self.ibcao     = ibcao
+    self.workers   = workers if workers is not None else (os.cpu_count () or 1)
+    self.processes = processes
+
+    if processes:
+      # a subset uses the grid of its full instance
+      full   = ibcao._parent if ibcao._parent is not None else ibcao
+      window = ibcao._window if ibcao._parent is not None else None
+
+      self._pool = ProcessPoolExecutor (self.workers, initializer = _init_worker,
+                      initargs = (ibcao.ibcao_grid, ibcao.persist, ibcao.cache_dir,
+                                  ibcao._splines.maxbytes, ibcao._native is not None,
+                                  full.shared_name, window))
+    else:
+      self._pool = ThreadPoolExecutor (self.workers)
+
+  def close (self):
+    """
+    Shut down the workers.
+    """
+    self._pool.shutdown ()
+
+  def __enter__ (self):
+    return self
+
+  def __exit__ (self, *args):
+    self.close ()
+
+  def _run (self, fname, a, b, **kwargs):
+    """
+    Split `a` and `b` in chunks and call `fname` on the IBCAO instance of the
+    workers for each chunk.
+    """
+    a, b = np.broadcast_arrays (np.asarray (a, dtype = np.float64),
+                                np.asarray (b, dtype = np.float64))
+    d = np.empty (a.shape)
+    if a.ndim == 0:
+      a, b = a.reshape (1), b.reshape (1)
+
+    # a few chunks per worker to even out the load, the chunks are blocks
+    # along the first axis so broadcast inputs are not expanded in full
+    n  = max (self._min_chunk, -(-a.size // (4 * self.workers)))
+    sl = list (self.ibcao._blocks (a.shape, n))
+
+    if self.processes:
+      fs = [ self._pool.submit (_call_worker, fname, (a[s], b[s]), kwargs) for s in sl ]
+    else:
+      f  = getattr (self.ibcao, fname)
+      fs = [ self._pool.submit (f, a[s], b[s], **kwargs) for s in sl ]
+
+    dd = d.reshape (a.shape)
+    for s, f in zip (sl, fs):
+      dd[s] = f.result ()
+
+    return d
+
+  def map_depth (self, x, y, order = 3, window = False, sort = False, level = 0):
+    """
+    Parallel `IBCAO.map_depth`.
+    """
+    if not self.processes and not window:
+      # compute the coefficients once, before the workers need them
+      self.ibcao.coefficients (order, level)
+
+    return self._run ('map_depth', x, y, order = order, window = window,
+                      sort = sort, level = level)
+
+  def interp_depth (self, x, y):
+    """
+    Parallel `IBCAO.interp_depth`.
+    """
+    return self._run ('interp_depth', x, y)
+
+  def depth_at (self, lon, lat, method = 'map', order = 3, window = False):
+    """
+    Parallel `IBCAO.depth_at`.
+    """
+    if method == 'map' and not self.processes and not window:
+      self.ibcao.coefficients (order)
+
+    return self._run ('depth_at', lon, lat, method = method, order = order,
+                      window = window)
+
+  def map_field (self, x, y, field, order = None):
+    """
+    Parallel `IBCAO.map_field`. With `processes` `field` should be the name
+    of a field, which every worker computes unless it is persisted.
+    """
+    if isinstance (field, str) and not self.processes:
+      # compute the field once, before the workers need it
+      getattr (self.ibcao, field) ()
+
+    return self._run ('map_field', x, y, field = field, order = order)
+
@@ -12,6 +12,7 @@ import matplotlib.pyplot as plt
 
 import os
 import os.path
+import time
 
 class IbcaoDepthTest (ut.TestCase):
   def setUp (self):
@@ -128,3 +129,68 @@ class IbcaoDepthTest (ut.TestCase):
     # high atol = 22 needed for python 3.4
     np.testing.assert_allclose (gmtz, dz, atol = 22)
     np.testing.assert_allclose (gmtz, mz, atol = 22)
+
+  def test_depth_at (self):
+    ll.info ('testing depth_at against transform and map_depth')
+
+    lon, lat = self.get_lon_lat (300, 300)
+    lon = lon.reshape (300, 300)
+    lat = lat.reshape (300, 300)
+
+    # make sure the coefficients are ready
+    self.i.coefficients (3)
+
+    t0 = time.time ()
+    xy = self.i.projection.transform_points (ccrs.Geodetic (), lon.ravel (), lat.ravel ())
+    z  = self.i.map_depth (xy[:,0], xy[:,1]).reshape (lon.shape)
+    t1 = time.time ()
+    d  = self.i.depth_at (lon, lat)
+    t2 = time.time ()
+
+    ll.info ('transform and map_depth: %.3f s, depth_at: %.3f s' % (t1 - t0, t2 - t1))
+
+    self.assertEqual (d.shape, lon.shape)
+    np.testing.assert_allclose (d, z, atol = 1e-6)
+
+    out = np.empty (lon.shape)
+    self.assertIs (self.i.depth_at (lon, lat, out = out), out)
+    np.testing.assert_array_equal (out, d)
+
+    di = self.i.depth_at (lon[:10], lat[:10], method = 'interp')
+    np.testing.assert_allclose (di, z[:10], atol = 1)
+
+  def test_profile (self):
+    ll.info ('testing profile against npts along great circles')
+
+    tracks = [ [(10, 78), (-18, 76)], [], [(5, 85)], [(0, 80), (20, 82), (40, 80)] ]
+
+    t0 = time.time ()
+    p  = self.i.profile (tracks, spacing_m = 5000.)
+    t1 = time.time ()
+    ll.info ('profile: %.3f s for %d points' % (t1 - t0, len(p.lon)))
+
+    self.assertEqual (len(p.offsets), len(tracks) + 1)
+    self.assertEqual (p.offsets[2] - p.offsets[1], 0)
+    self.assertEqual (p.offsets[3] - p.offsets[2], 1)
+    self.assertEqual (p.offsets[-1], len(p.depth))
+
+    # first track: equally spaced points on the great circle
+    a, b = p.offsets[0], p.offsets[1]
+    n  = b - a
+    gc = np.array (self.i.geod.npts (10, 78, -18, 76, n - 2))
+    np.testing.assert_allclose (p.lon[a + 1:b - 1], gc[:,0], atol = 1e-6)
+    np.testing.assert_allclose (p.lat[a + 1:b - 1], gc[:,1], atol = 1e-6)
+    np.testing.assert_allclose (p.depth[a:b], self.i.depth_at (p.lon[a:b], p.lat[a:b]))
+
+    # vertices are kept and distance is along the track
+    _, _, d0 = self.i.geod.inv (0, 80, 20, 82)
+    _, _, d1 = self.i.geod.inv (20, 82, 40, 80)
+    self.assertEqual ((p.lon[-1], p.lat[-1]), (40, 80))
+    self.assertAlmostEqual (p.distance[-1], d0 + d1, places = 3)
+    self.assertTrue (np.diff (p.distance[p.offsets[3]:]).max () <= 5000.)
+
+    # no tracks
+    p = self.i.profile ([])
+    np.testing.assert_array_equal (p.offsets, [0])
+    for a in (p.lon, p.lat, p.distance, p.depth):
+      self.assertEqual (a.shape, (0,))
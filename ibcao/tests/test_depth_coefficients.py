@@ -0,0 +1,67 @@
+# encoding: utf-8
+import common
+from common import outdir
+import logging as ll
+import unittest as ut
+
+from ibcao  import *
+import cartopy.crs as ccrs
+
+import os
+import os.path
+import time
+
+class IbcaoCoefficientsTest (ut.TestCase):
+  def setUp (self):
+    self.i = IBCAO ()
+
+  def tearDown (self):
+    self.i.close ()
+    del self.i
+
+  def get_xy (self, nlat = 30, nlon = 30):
+    lat = np.linspace (60, 90, nlat)
+    lon = np.linspace (-180, 180, nlon)
+
+    lat, lon = np.meshgrid (lat, lon)
+
+    xy = self.i.projection.transform_points (ccrs.Geodetic (), lon.ravel (), lat.ravel ())
+    return (xy[:,0], xy[:,1])
+
+  def test_cached_vs_prefilter (self):
+    ll.info ('testing cached coefficients against map_coordinates with prefilter')
+    from scipy.ndimage import map_coordinates
+
+    x, y = self.get_xy ()
+
+    xx = (x + self.i.extent) / self.i.resolution
+    yy = (y + self.i.extent) / self.i.resolution
+    z  = map_coordinates (self.i.z, [yy, xx], cval = np.nan)
+
+    t0 = time.time ()
+    d = self.i.map_depth (x, y)
+    t1 = time.time ()
+    d = self.i.map_depth (x, y)
+    t2 = time.time ()
+
+    ll.info ('first map_depth: %.2f s, cached: %.4f s' % (t1 - t0, t2 - t1))
+
+    np.testing.assert_allclose (d, z)
+    self.assertIs (self.i.coefficients (3), self.i.coefficients (3))
+
+  def test_persist (self):
+    ll.info ('testing persisted coefficients')
+
+    x, y = self.get_xy (10, 10)
+
+    i = IBCAO (persist = True, cache_dir = outdir)
+    d = i.map_depth (x, y)
+    self.assertTrue (os.path.exists (i._sidecar ('spline3')))
+
+    j = IBCAO (cache_dir = outdir)
+    c = j.coefficients (3)
+    self.assertIsInstance (c, np.memmap)
+
+    np.testing.assert_array_equal (d, j.map_depth (x, y))
+
+    os.remove (i._sidecar ('spline3'))
@@ -98,3 +98,59 @@ class IbcaoDepthTest (ut.TestCase):
 
     np.testing.assert_allclose (dz, d, atol = 1)
 
+  def test_tile_splines (self):
+    ll.info ('testing tiled interp_depth against a spline fit on a large window')
+    from scipy.interpolate import RectBivariateSpline
+
+    r0, r1, c0, c1 = 4000, 5500, 5000, 6500
+    depth_f = RectBivariateSpline (self.i.y[r0:r1], self.i.x[c0:c1], self.i.z[r0:r1, c0:c1])
+
+    # stay away from the edges of the reference window
+    x = np.random.uniform (self.i.x[c0 + 100], self.i.x[c1 - 100], 1000)
+    y = np.random.uniform (self.i.y[r0 + 100], self.i.y[r1 - 100], 1000)
+
+    d = self.i.interp_depth (x, y)
+    np.testing.assert_allclose (d, depth_f.ev (y, x), atol = 1e-6)
+
+  def test_tile_cache_budget (self):
+    ll.info ('testing memory budget of tile cache')
+
+    i = IBCAO (cache_size = 2 * 1024**2)
+
+    x = np.random.uniform (-self.i.extent, self.i.extent, 100)
+    y = np.random.uniform (-self.i.extent, self.i.extent, 100)
+
+    d = i.interp_depth (x, y)
+
+    info = i.cache_info ()
+    ll.info (str(info))
+    self.assertLessEqual (info.nbytes, info.maxbytes)
+    self.assertGreater (info.currsize, 0)
+    self.assertGreater (info.evictions, 0)
+
+    np.testing.assert_allclose (d, self.i.interp_depth (x, y))
+
+  def test_cache_info (self):
+    ll.info ('testing cache statistics')
+
+    x = np.random.uniform (3e5, 4e5, 100)
+    y = np.random.uniform (-1e6, -9e5, 100)
+
+    d = self.i.interp_depth (x, y)
+    info = self.i.cache_info ()
+    self.assertEqual (info.hits, 0)
+    self.assertEqual (info.misses, info.currsize)
+    self.assertGreater (info.build_time, 0)
+
+    dd = self.i.interp_depth (x, y)
+    self.assertEqual (self.i.cache_info ().hits, info.currsize)
+    np.testing.assert_array_equal (d, dd)
+
+    self.i.clear_cache ()
+    info = self.i.cache_info ()
+    self.assertEqual (info.currsize, 0)
+    self.assertEqual (info.nbytes, 0)
+
+    # caches are not shared between instances
+    i = IBCAO ()
+    self.assertEqual (i.cache_info ().currsize, 0)
@@ -12,6 +12,7 @@ import matplotlib.pyplot as plt
 
 import os
 import os.path
+import warnings
 
 class IbcaoDepthTest (ut.TestCase):
   def setUp (self):
@@ -57,5 +58,155 @@ class IbcaoDepthTest (ut.TestCase):
 
       plt.savefig (os.path.join (outdir, 'resampled_map.png'))
 
+  def test_window (self):
+    ll.info ('testing windowed map_depth against full grid')
 
+    x = np.random.uniform (-self.i.extent, self.i.extent, 2000)
+    y = np.random.uniform (-self.i.extent, self.i.extent, 2000)
 
+    # a cluster and points on and outside the edges
+    x[:100] = np.random.uniform (3e5, 4e5, 100)
+    y[:100] = np.random.uniform (-1e6, -9e5, 100)
+    x[100:104] = [ -self.i.extent, self.i.extent, self.i.extent + 1, 0 ]
+    y[100:104] = [ 0, self.i.extent, 0, -self.i.extent - 1 ]
+
+    for order in [1, 3]:
+      z = self.i.map_depth (x, y, order = order)
+      w = self.i.map_depth (x, y, order = order, window = True)
+
+      np.testing.assert_allclose (z, w, atol = 1e-6)
+
+  def test_chunks (self):
+    ll.info ('testing chunked map_depth and iter_depth')
+
+    x = np.random.uniform (-self.i.extent, self.i.extent, 10000)
+    y = np.random.uniform (-self.i.extent, self.i.extent, 10000)
+
+    z = self.i.map_depth (x, y)
+
+    d = self.i.map_depth (x, y, chunk_size = 999)
+    np.testing.assert_array_equal (z, d)
+
+    d = self.i.map_depth (x.reshape (100, 100), y.reshape (100, 100), chunk_size = 999)
+    self.assertEqual (d.shape, (100, 100))
+    np.testing.assert_array_equal (z, d.ravel ())
+
+    chunks = ((x[i:i+3000], y[i:i+3000]) for i in range (0, len(x), 3000))
+    d = list (self.i.iter_depth (chunks))
+    self.assertEqual (len(d), 4)
+    np.testing.assert_array_equal (z, np.concatenate (d))
+
+  def test_sort (self):
+    ll.info ('testing map_depth with points in z-order')
+
+    x = np.random.uniform (-self.i.extent - 1e4, self.i.extent + 1e4, 10000)
+    y = np.random.uniform (-self.i.extent - 1e4, self.i.extent + 1e4, 10000)
+
+    for order in [1, 3]:
+      z = self.i.map_depth (x, y, order = order)
+
+      d = self.i.map_depth (x, y, order = order, sort = True)
+      np.testing.assert_array_equal (z, d)
+
+      d = self.i.map_depth (x, y, order = order, sort = True, chunk_size = 3000)
+      np.testing.assert_array_equal (z, d)
+
+    # non-finite points are nan, without warnings
+    x[:4] = [ np.nan, np.inf, -np.inf, 0. ]
+    y[:4] = [ 0., 0., np.nan, np.inf ]
+    for order in [0, 1, 3]:
+      with warnings.catch_warnings ():
+        warnings.simplefilter ('error')
+        d = self.i.map_depth (x, y, order = order, sort = True)
+
+      self.assertTrue (np.isnan (d[:4]).all ())
+      np.testing.assert_array_equal (d[4:], self.i.map_depth (x[4:], y[4:], order = order))
+
+  def test_kernels (self):
+    ll.info ('testing nearest and bilinear kernels against map_coordinates')
+    from scipy.ndimage import map_coordinates
+    import time
+
+    n = 1000000
+    x = np.random.uniform (-3e6, 3e6, n)
+    y = np.random.uniform (-3e6, 3e6, n)
+
+    r, c = self.i._index (x, y)
+
+    for order in (0, 1):
+      t0 = time.time ()
+      z  = map_coordinates (self.i.z, [r, c], cval = np.nan, order = order, prefilter = False)
+      t1 = time.time ()
+      d  = self.i.map_depth (x, y, order = order)
+      t2 = time.time ()
+
+      ll.info ('order %d: map_coordinates: %.3f s, map_depth: %.3f s' % (order, t1 - t0, t2 - t1))
+      np.testing.assert_allclose (d, z)
+
+    # edges
+    ny, nx = self.i.z.shape
+    r = np.array ([0, 0, ny - 1, ny - 1, 0.5, -1e-9, ny - 1 + 1e-9, 3.5])
+    c = np.array ([0, nx - 1, 0, nx - 1, 1.5, 0, 0, nx - 1.5])
+
+    for order in (0, 1):
+      z = map_coordinates (self.i.z, [r, c], cval = np.nan, order = order, prefilter = False)
+      np.testing.assert_allclose (self.i._map_index (r, c, order), z)
+
+  def test_sparse_grid (self):
+    ll.info ('testing map_depth on sparse and broadcast grids')
+
+    div = 50
+    x, y = self.i.grid (div)
+    self.assertEqual (x.shape, self.i.z[::div, ::div].shape)
+    np.testing.assert_array_equal (x[0], self.i.x[::div])
+    np.testing.assert_array_equal (y[:,0], self.i.y[::div])
+
+    xs, ys = self.i.grid (div, sparse = True)
+    self.assertEqual (xs.shape, (1, x.shape[1]))
+    self.assertEqual (ys.shape, (x.shape[0], 1))
+
+    xv, yv = self.i.grid (div, copy = False)
+    np.testing.assert_array_equal (xv, x)
+
+    z = self.i.map_depth (x, y)
+    np.testing.assert_array_equal (self.i.map_depth (xs, ys), z)
+    np.testing.assert_allclose (self.i.map_depth (xv, yv, chunk_size = 1000), z)
+    np.testing.assert_allclose (self.i.map_depth (xs, ys, order = 1, chunk_size = 300),
+                                self.i.map_depth (x, y, order = 1))
+
+    lon, lat = self.i.xy_to_lonlat (xs, ys)
+    self.assertEqual (lon.shape, x.shape)
+    # the edges may fall outside after the round trip
+    np.testing.assert_allclose (self.i.depth_at (lon, lat)[1:-1, 1:-1], z[1:-1, 1:-1], atol = 1e-6)
+
+    np.testing.assert_allclose (self.i.interp_depth (xs, ys), self.i.interp_depth (x, y))
+
+    # broadcast inputs are only expanded in blocks, the result is the
+    # largest allocation
+    import tracemalloc
+    xs, ys = self.i.grid (5, sparse = True)
+    self.i.map_depth (xs[:, :10], ys[:10], order = 1)
+
+    tracemalloc.start ()
+    d = self.i.map_depth (xs, ys, order = 1)
+    _, peak = tracemalloc.get_traced_memory ()
+    tracemalloc.stop ()
+
+    ll.info ('map_depth on sparse grid: %.1f MB, peak %.1f MB' % (d.nbytes / 1024**2, peak / 1024**2))
+    self.assertLess (peak, 2 * d.nbytes)
+    np.testing.assert_array_equal (d, self.i.map_depth (xs, ys, order = 1, chunk_size = 10**9))
+
+  def test_iter_grid (self):
+    ll.info ('testing iterating over the grid in blocks')
+
+    div = 10
+    x, y = self.i.grid (div)
+    z = np.empty (x.shape)
+
+    n = 0
+    for s, xb, yb in self.i.iter_grid (div, rows = 100):
+      z[s] = self.i.map_depth (xb, yb, order = 1)
+      n += 1
+
+    self.assertEqual (n, -(-x.shape[0] // 100))
+    np.testing.assert_array_equal (z, self.i.map_depth (x, y, order = 1))
@@ -0,0 +1,56 @@
+# encoding: utf-8
+import common
+import logging as ll
+import unittest as ut
+
+import os
+import os.path
+import subprocess
+import sys
+
+# the plotting and projection libraries should only be loaded when used
+HEAVY = ['matplotlib', 'cartopy', 'pyproj']
+
+class IbcaoImportTest (ut.TestCase):
+  def run_python (self, code):
+    cwd = os.path.join (common.TESTDIR, '..', '..')
+    out = subprocess.check_output ([sys.executable, '-c', code], cwd = cwd)
+
+    # last line: loaded heavy modules
+    out = [l for l in out.decode ().split ('\n') if l.startswith ('modules:')]
+    return out[-1][len('modules:'):].split (',')
+
+  def test_import_time (self):
+    ll.info ('testing import time and imported modules')
+
+    code = """
+import time, sys
+t0 = time.perf_counter ()
+import ibcao
+t1 = time.perf_counter ()
+print ('modules:%%f,' %% (t1 - t0) + ','.join (m for m in %s if m in sys.modules))
+""" % HEAVY
+
+    out = self.run_python (code)
+    ll.info ('import ibcao: %s s' % out[0])
+
+    self.assertEqual ([m for m in out[1:] if m], [])
+
+  def test_depth_imports (self):
+    ll.info ('testing modules imported by depth functions')
+
+    code = """
+import sys
+import numpy as np
+from ibcao import IBCAO
+i = IBCAO ()
+x = np.array ([0., 1e5])
+i.map_depth (x, x)
+i.map_depth (x, x, window = True)
+i.interp_depth (x, x)
+print ('modules:' + ','.join (m for m in %s if m in sys.modules))
+""" % HEAVY
+
+    out = self.run_python (code)
+
+    self.assertEqual ([m for m in out if m], [])
@@ -0,0 +1,138 @@
+# encoding: utf-8
+import common
+from common import outdir
+import logging as ll
+import unittest as ut
+
+from ibcao  import *
+
+import os
+import os.path
+import time
+
+class IbcaoIsobathTest (ut.TestCase):
+  def setUp (self):
+    self.i = IBCAO ()
+    self.s = self.i.subset (lon = (-20, 15), lat = (76, 82))
+
+  def tearDown (self):
+    self.i.close ()
+    del self.i
+
+  def get_xy (self, n = 200):
+    rng = np.random.default_rng (1)
+    x = rng.uniform (*self.s.xlim, n)
+    y = rng.uniform (*self.s.ylim, n)
+    return (x, y)
+
+  # cells of the grid around the subset searched by brute_deeper
+  pad = 200
+
+  def brute_deeper (self, x, y, depth):
+    # map distance to the nearest cell deeper than depth, within `pad` cells
+    # around the subset
+    r0, r1, c0, c1 = self.s._window
+    p = self.pad
+    X, Y = np.meshgrid (self.i.x[c0 - p:c1 + p], self.i.y[r0 - p:r1 + p])
+    deep = np.asarray (self.i.z[r0 - p:r1 + p, c0 - p:c1 + p]) <= -depth
+    X, Y = X[deep], Y[deep]
+
+    return np.array ([ np.hypot (X - xx, Y - yy).min () for xx, yy in zip (x, y) ])
+
+  def test_nearest_deeper (self):
+    ll.info ('testing nearest deeper position against brute force')
+
+    depth = -float (np.median (self.s.z[::10, ::10]))
+    x, y = self.get_xy ()
+
+    t0 = time.time ()
+    xd, yd, d = self.s.nearest_deeper (x, y, depth)
+    ll.info ('nearest_deeper: %.3f s' % (time.time () - t0))
+
+    # the positions are deeper (and may be outside the subset)
+    z = self.i.map_depth (xd, yd, order = 0)
+    self.assertTrue (np.all (z <= -depth))
+
+    # and at most a cell further away than the nearest deeper cell
+    b = self.brute_deeper (x, y, depth)
+    m = np.hypot (xd - x, yd - y)
+    shallow = m > 0
+    self.assertTrue (np.any (shallow))
+    self.assertTrue (np.all (m[shallow] <= b[shallow] + np.sqrt (2) * self.s.resolution))
+    self.assertTrue (np.all (d[~shallow] == 0))
+
+    # true distance
+    lon, lat = self.s.xy_to_lonlat (x, y)
+    np.testing.assert_allclose (d, m / self.s.point_scale (lat), rtol = 1e-6)
+
+  def test_distance_to_isobath (self):
+    ll.info ('testing distance to isobath')
+
+    depth = -float (np.median (self.s.z[::10, ::10]))
+    x, y = self.get_xy (100000)
+
+    t0 = time.time ()
+    d = self.s.distance_to_isobath (x, y, depth, signed = True)
+    ll.info ('distance_to_isobath: %.3f s for %d points' % (time.time () - t0, len(x)))
+
+    z = self.s.map_depth (x, y, order = 0)
+    np.testing.assert_array_equal (d < 0, z <= -depth)
+    np.testing.assert_array_equal (np.abs (d), self.s.distance_to_isobath (x, y, depth))
+
+    # shallow points are within a cell of the nearest deeper cell
+    b = self.brute_deeper (x[:200], y[:200], depth)
+    lon, lat = self.s.xy_to_lonlat (x[:200], y[:200])
+    m = d[:200] * self.s.point_scale (lat)
+    shallow = (m > 0) & (b <= self.pad * self.s.resolution)
+    self.assertTrue (np.any (shallow))
+    self.assertTrue (np.all (np.abs (m[shallow] - b[shallow]) <= self.s.resolution))
+
+    # outside the grid
+    self.assertTrue (np.isnan (self.s.distance_to_isobath (0., 0., depth)))
+
+    # no isobath
+    self.assertTrue (np.isinf (self.s.distance_to_isobath (x[:10], y[:10], 20000)).all ())
+
+  def test_subset_edge (self):
+    ll.info ('testing isobaths near the edges of a subset')
+
+    # the subset is shallower than the isobath, which is found outside it
+    z = np.asarray (self.i.z[::10, ::10])
+    s = self.i.subset (x = (-1e5, 1e5), y = (-1e5, 1e5))
+    depth = -float (np.asarray (s.z).min ()) + 100.
+    self.assertTrue (depth < -z.min ())
+
+    x = np.linspace (s.xlim[0], s.xlim[1], 1000)
+    y = np.full (x.shape, s.ylim[0])
+
+    d = s.distance_to_isobath (x, y, depth)
+    self.assertTrue (np.isfinite (d).all ())
+    np.testing.assert_array_equal (d, self.i.distance_to_isobath (x, y, depth))
+
+    xd, yd, dd = s.nearest_deeper (x, y, depth)
+    fx, fy, fd = self.i.nearest_deeper (x, y, depth)
+    np.testing.assert_array_equal (xd, fx)
+    np.testing.assert_array_equal (yd, fy)
+    np.testing.assert_array_equal (dd, fd)
+    self.assertTrue (np.all (self.i.map_depth (xd, yd, order = 0) <= -depth))
+
+    # points outside the subset are nan
+    self.assertTrue (np.isnan (s.distance_to_isobath (2e5, 0., depth)))
+
+  def test_persist (self):
+    ll.info ('testing persisted isobath index')
+
+    i = IBCAO (persist = True, cache_dir = outdir)
+    s = i.subset (lon = (-20, 15), lat = (76, 82))
+    x, y = self.get_xy ()
+    d = s.distance_to_isobath (x, y, 1000)
+
+    # the index is of the full grid
+    fname = i._sidecar ('isobath_1000')
+    self.assertTrue (os.path.exists (fname))
+
+    j = IBCAO (cache_dir = outdir).subset (lon = (-20, 15), lat = (76, 82))
+    np.testing.assert_array_equal (j.distance_to_isobath (x, y, 1000), d)
+
+    i.close ()
+    os.remove (fname)
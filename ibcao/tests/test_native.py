@@ -0,0 +1,53 @@
+# encoding: utf-8
+import common
+from common import outdir
+import logging as ll
+import unittest as ut
+
+from ibcao  import *
+
+import os
+import os.path
+import time
+
+class IbcaoNativeTest (ut.TestCase):
+  def setUp (self):
+    self.i = IBCAO ()
+
+  def tearDown (self):
+    self.i.close ()
+    del self.i
+
+  def test_native (self):
+    ll.info ('testing native-endian copy of grid')
+    from scipy.ndimage import map_coordinates
+
+    n = IBCAO (cache_dir = outdir, native = True)
+
+    self.assertFalse (self.i.z.dtype.isnative)
+    self.assertTrue (n.z.dtype.isnative)
+    self.assertIsInstance (n.z, np.memmap)
+    np.testing.assert_array_equal (self.i.z, n.z)
+
+    # reused by later instances
+    t0 = time.time ()
+    m = IBCAO (cache_dir = outdir, native = True)
+    ll.info ('open native copy: %.4f s' % (time.time () - t0))
+    self.assertEqual (m.z.filename, n.z.filename)
+
+    c = np.random.uniform (0, self.i.z.shape[0] - 1, (2, 1000000))
+
+    t0 = time.time ()
+    zb = map_coordinates (self.i.z, c, order = 1)
+    t1 = time.time ()
+    zn = map_coordinates (n.z, c, order = 1)
+    t2 = time.time ()
+
+    ll.info ('map_coordinates, big-endian: %.3f s, native: %.3f s' % (t1 - t0, t2 - t1))
+    np.testing.assert_array_equal (zb, zn)
+
+    x = np.random.uniform (-self.i.extent, self.i.extent, 1000)
+    y = np.random.uniform (-self.i.extent, self.i.extent, 1000)
+    np.testing.assert_allclose (self.i.map_depth (x, y), n.map_depth (x, y))
+
+    os.remove (n._sidecar ('z'))
@@ -0,0 +1,139 @@
+# encoding: utf-8
+import common
+from common import outdir
+import logging as ll
+import unittest as ut
+
+from ibcao  import *
+
+import os
+import os.path
+import time
+
+class IbcaoOceanTest (ut.TestCase):
+  def setUp (self):
+    self.i = IBCAO ()
+
+  def tearDown (self):
+    self.i.close ()
+    del self.i
+
+    if getattr (self, 'flat', None) is not None:
+      os.remove (self.flat)
+
+  def get_xy (self, n = 1000000):
+    rng = np.random.default_rng (1)
+    x = rng.uniform (-3e6, 3e6, n)
+    y = rng.uniform (-3e6, 3e6, n)
+    return (x, y)
+
+  def test_ocean_mask (self):
+    ll.info ('testing bit-packed ocean mask')
+
+    s = self.i.subset (x = (-2e5, 2e5), y = (-4e5, 1e5))
+    m = s.ocean_mask ()
+    self.assertEqual (m.shape, (s.z.shape[0], -(-s.z.shape[1] // 8)))
+
+    o = np.unpackbits (m, axis = 1, count = s.z.shape[1]).view (bool)
+    np.testing.assert_array_equal (o, np.asarray (s.z) <= 0)
+
+  def test_is_ocean (self):
+    ll.info ('testing is_ocean against map_depth')
+
+    x, y = self.get_xy ()
+    self.i.ocean_mask ()
+
+    t0 = time.time ()
+    o  = self.i.is_ocean (x, y)
+    t1 = time.time ()
+    z  = self.i.map_depth (x, y, order = 0)
+    t2 = time.time ()
+
+    ll.info ('is_ocean: %.3f s, map_depth: %.3f s' % (t1 - t0, t2 - t1))
+    np.testing.assert_array_equal (o, z <= 0)
+
+    self.assertEqual (self.i.is_ocean (x[:10].reshape (2, 5), y[:10].reshape (2, 5)).shape, (2, 5))
+
+  def inject (self, land):
+    """
+    Replaces the grid with flat ocean (in a sparse file) and the `land`
+    (rows, columns) slices in full grid indices, the fixture grid may not
+    have any land.
+    """
+    self.flat = os.path.join (outdir, 'flat.bin')
+    g = np.memmap (self.flat, dtype = np.float32, mode = 'w+', shape = self.i._grid.shape)
+    for r, c in land:
+      g[r, c] = 100.
+    g.flush ()
+
+    self.i._native = g
+
+  def test_distance_to_coast (self):
+    ll.info ('testing distance to coast')
+
+    ny, nx = self.i._grid.shape
+    R, C   = ny // 2 + 300, nx // 2 + 500
+    self.inject ([ (slice (R, R + 6), slice (C, C + 4)),
+                   (slice (R + 40, R + 41), slice (C + 30, C + 31)) ])
+
+    lr, lc = np.nonzero (np.asarray (self.i._grid[R - 10:R + 50, C - 10:C + 40]) > 0)
+    lr, lc = lr + R - 10, lc + C - 10
+    self.assertEqual (len(lr), 25)
+
+    # the window ends a few cells before the land
+    res = self.i.resolution
+    xc  = -self.i.extent + C * res
+    yr  = -self.i.extent + R * res
+    s   = self.i.subset (x = (xc - 300 * res, xc - 8 * res), y = (yr - 200 * res, yr + 200 * res))
+    r0, r1, c0, c1 = s._window
+    self.assertLess (c1, C)
+
+    d = s.coast_distance ()
+    self.assertEqual (d.shape, s.z.shape)
+    self.assertEqual (d.dtype, np.float32)
+    self.assertTrue (np.isfinite (d).all ())
+
+    # against brute force
+    r, c = np.mgrid[r0:r1, c0:c1]
+    b = res * np.hypot (r[..., np.newaxis] - lr, c[..., np.newaxis] - lc).min (axis = -1)
+    np.testing.assert_allclose (d, b, rtol = 1e-6)
+    self.assertEqual (d[R - r0, -1], res * (C - c1 + 1))
+
+    # against a subset with the land and the full grid
+    w  = self.i.subset (x = (xc - 300 * res, xc + 100 * res), y = (yr - 200 * res, yr + 200 * res))
+    dw = w.coast_distance ()
+    np.testing.assert_array_equal (dw[lr - w._window[0], lc - w._window[2]], 0)
+    np.testing.assert_array_equal (dw[r0 - w._window[0]:r1 - w._window[0], c0 - w._window[2]:c1 - w._window[2]], d)
+    np.testing.assert_array_equal (self.i.coast_distance ()[r0:r1, c0:c1], d)
+
+    # points
+    x = s.x[c[:, :5].ravel () - c0]
+    y = s.y[r[:, :5].ravel () - r0]
+    lon, lat = s.xy_to_lonlat (x, y)
+    np.testing.assert_allclose (s.distance_to_coast (x, y), d[:, :5].ravel () / s.point_scale (lat), rtol = 1e-5)
+
+    self.assertTrue (np.isnan (s.distance_to_coast (0., 0.)))
+    self.assertEqual (w.distance_to_coast (-self.i.extent + lc[0] * res, -self.i.extent + lr[0] * res), 0)
+
+  def test_distance_to_coast_no_land (self):
+    ll.info ('testing distance to coast without land')
+
+    self.inject ([])
+
+    s = self.i.subset (x = (-2e5, 2e5), y = (-4e5, 1e5))
+    self.assertTrue (np.isinf (s.coast_distance ()).all ())
+    self.assertTrue (np.isinf (s.distance_to_coast (0., 0.)))
+    self.assertTrue (np.isnan (s.distance_to_coast (1e6, 1e6)))
+
+  def test_persist (self):
+    ll.info ('testing persisted ocean mask')
+
+    i = IBCAO (persist = True, cache_dir = outdir)
+    m = i.ocean_mask ()
+
+    j = IBCAO (cache_dir = outdir)
+    self.assertIsInstance (j.ocean_mask (), np.memmap)
+    np.testing.assert_array_equal (j.ocean_mask (), m)
+
+    i.close ()
+    os.remove (i._sidecar ('ocean'))
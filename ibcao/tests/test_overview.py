@@ -0,0 +1,70 @@
+# encoding: utf-8
+import common
+from common import outdir
+import logging as ll
+import unittest as ut
+
+from ibcao  import *
+
+import os
+import os.path
+import time
+
+class IbcaoOverviewTest (ut.TestCase):
+  def setUp (self):
+    self.i = IBCAO ()
+
+  def tearDown (self):
+    self.i.close ()
+    del self.i
+
+  def test_overview (self):
+    ll.info ('testing overview levels')
+
+    z = self.i.z
+
+    x, y, o = self.i.overview (1)
+    self.assertEqual (o.shape, ((z.shape[0] + 1) // 2, (z.shape[1] + 1) // 2))
+    np.testing.assert_allclose (o[:50, :50],
+        z[:100, :100].astype (np.float64).reshape (50, 2, 50, 2).mean (axis = (1, 3)), rtol = 1e-6)
+
+    # uneven edge only covers one cell
+    self.assertEqual (o[-1, -1], z[-1, -1])
+
+    x, y, o = self.i.overview (3)
+    np.testing.assert_allclose (o[3, 5], z[24:32, 40:48].astype (np.float64).mean (), rtol = 1e-6)
+    np.testing.assert_allclose (x[5], self.i.x[40:48].mean ())
+    np.testing.assert_allclose (y[3], self.i.y[24:32].mean ())
+
+    _, _, mn = self.i.overview (3, 'min')
+    _, _, mx = self.i.overview (3, 'max')
+    self.assertEqual (mn[3, 5], z[24:32, 40:48].min ())
+    self.assertEqual (mx[3, 5], z[24:32, 40:48].max ())
+
+  def test_map_depth_level (self):
+    ll.info ('testing map_depth on overview')
+
+    x, y, o = self.i.overview (2)
+
+    d = self.i.map_depth (x[10:20], y[[7] * 10], order = 1, level = 2)
+    np.testing.assert_allclose (d, o[7, 10:20])
+
+    d = self.i.map_depth (x[10:20], y[[7] * 10], level = 2, window = True)
+    np.testing.assert_allclose (d, o[7, 10:20], rtol = 1e-6)
+
+  def test_persist (self):
+    ll.info ('testing persisted overviews')
+
+    i = IBCAO (persist = True, cache_dir = outdir)
+    _, _, o = i.overview (2)
+
+    j = IBCAO (cache_dir = outdir)
+    t0 = time.time ()
+    _, _, p = j.overview (2)
+    ll.info ('overview from sidecar: %.4f s' % (time.time () - t0))
+
+    self.assertIsInstance (p, np.memmap)
+    np.testing.assert_array_equal (o, p)
+
+    for l in [1, 2]:
+      os.remove (i._sidecar ('ovr%d_mean' % l))
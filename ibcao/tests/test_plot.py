@@ -54,3 +54,9 @@ class IbcaoPlotTest (ut.TestCase):
 
     plt.savefig (os.path.join (outdir, 'test.png'))
 
+  def test_template_overview (self):
+    ll.info ("testing template with overview")
+    f = self.i.template (level = 4)
+
+    f.savefig (os.path.join (outdir, 'test_template_overview.png'))
+
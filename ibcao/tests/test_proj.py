@@ -183,4 +183,107 @@ class IbcaoProjTest (ut.TestCase):
     np.testing.assert_allclose (x, nx )
     np.testing.assert_allclose (y, ny )
 
+  def test_lonlat_to_xy (self):
+    ll.info ("testing lonlat_to_xy against proj and cartopy")
 
+    lon = np.random.uniform (-180, 180, 10000)
+    lat = np.random.uniform (50, 90, 10000)
+    lat[0] = 90
+
+    x, y = self.i.lonlat_to_xy (lon, lat)
+
+    nx, ny = self.get_np_stere () (lon, lat)
+    np.testing.assert_allclose (x, nx, atol = 1e-6)
+    np.testing.assert_allclose (y, ny, atol = 1e-6)
+
+    xy = self.i.projection.transform_points (ccrs.Geodetic (), lon, lat)
+    np.testing.assert_allclose (x, xy[:,0], atol = 1e-6)
+    np.testing.assert_allclose (y, xy[:,1], atol = 1e-6)
+
+    # north pole
+    np.testing.assert_array_equal ((x[0], y[0]), (0, 0))
+
+    # in place
+    ox = np.empty (lon.shape)
+    oy = np.empty (lon.shape)
+    rx, ry = self.i.lonlat_to_xy (lon, lat, out = (ox, oy))
+    self.assertIs (rx, ox)
+    self.assertIs (ry, oy)
+    np.testing.assert_array_equal (ox, x)
+    np.testing.assert_array_equal (oy, y)
+
+    # scalars
+    sx, sy = self.i.lonlat_to_xy (lon[1], lat[1])
+    self.assertEqual (np.shape (sx), ())
+    self.assertEqual ((float (sx), float (sy)), (x[1], y[1]))
+
+    slon, slat = self.i.xy_to_lonlat (sx, sy)
+    np.testing.assert_allclose ((slon, slat), (lon[1], lat[1]))
+
+  def test_xy_to_lonlat (self):
+    ll.info ("testing xy_to_lonlat against proj")
+
+    x = np.random.uniform (-self.i.extent, self.i.extent, 10000)
+    y = np.random.uniform (-self.i.extent, self.i.extent, 10000)
+
+    lon, lat = self.i.xy_to_lonlat (x, y)
+
+    nlon, nlat = self.get_np_stere () (x, y, inverse = True)
+    np.testing.assert_allclose (lon, nlon, atol = 1e-9)
+    np.testing.assert_allclose (lat, nlat, atol = 1e-9)
+
+    # round trip
+    xx, yy = self.i.lonlat_to_xy (lon, lat)
+    np.testing.assert_allclose (xx, x, atol = 1e-4)
+    np.testing.assert_allclose (yy, y, atol = 1e-4)
+
+    # corners, see test_corners
+    lon, lat = self.i.xy_to_lonlat (np.array ([2902500.]), np.array ([-2902500.]))
+    np.testing.assert_allclose ((45, 53.8166 + 0.00040797), (lon[0], lat[0]), atol = 0.0001)
+
+  def test_point_scale (self):
+    ll.info ('testing point scale against proj')
+
+    lat = np.array ([55., 60., 75., 80., 89.99, 90.])
+    f   = self.i.proj.get_factors (np.zeros (lat.shape), lat)
+
+    k = self.i.point_scale (lat)
+    np.testing.assert_allclose (k, f.parallel_scale, rtol = 1e-9)
+    self.assertAlmostEqual (k[2], 1.)
+    self.assertAlmostEqual (k[-1], self.i.scale_factor)
+
+  def test_lonlat (self):
+    ll.info ('testing longitude and latitude tables')
+
+    x, y = self.i.grid (10, sparse = True)
+    lon, lat = self.i.xy_to_lonlat (x, y)
+
+    tl, tt = self.i.lonlat (10)
+    np.testing.assert_array_equal (tl, lon)
+    np.testing.assert_array_equal (tt, lat)
+    self.assertIs (self.i.lonlat (10)[0].base, tl.base)
+
+    tl, tt = self.i.lonlat (10, dtype = np.float32)
+    self.assertEqual (tt.dtype, np.float32)
+    np.testing.assert_allclose (tt, lat, atol = 1e-5)
+
+    xo, yo, _ = self.i.overview (3)
+    tl, tt = self.i.lonlat (level = 3)
+    np.testing.assert_allclose (tt, self.i.xy_to_lonlat (xo[np.newaxis, :], yo[:, np.newaxis])[1])
+
+  def test_lonlat_persist (self):
+    ll.info ('testing persisted longitude and latitude tables')
+
+    i = IBCAO (persist = True, cache_dir = outdir)
+    lon, lat = i.lonlat (20, dtype = np.float32)
+    fname = i._sidecar ('lonlat_l0_d20_float32')
+    self.assertTrue (os.path.exists (fname))
+
+    j = IBCAO (cache_dir = outdir)
+    jlon, jlat = j.lonlat (20, dtype = np.float32)
+    self.assertIsInstance (jlat, np.memmap)
+    np.testing.assert_array_equal (jlat, lat)
+
+    i.close ()
+    j.close ()
+    os.remove (fname)
@@ -0,0 +1,78 @@
+# encoding: utf-8
+import common
+import logging as ll
+import unittest as ut
+
+from ibcao  import *
+
+import time
+
+class IbcaoRegridTest (ut.TestCase):
+  def setUp (self):
+    self.i = IBCAO ()
+
+  def tearDown (self):
+    self.i.close ()
+    del self.i
+
+  def test_rectilinear (self):
+    ll.info ('testing regrid on rectilinear grid against depth_at')
+
+    lon = np.arange (-180, 180, .5)
+    lat = np.arange (66, 90, .1)
+    L, P = np.meshgrid (lon, lat)
+
+    for method, order in (('nearest', 0), ('bilinear', 1), ('cubic', 3)):
+      t0 = time.time ()
+      d  = self.i.regrid (lon, lat, method = method)
+      t1 = time.time ()
+      z  = self.i.depth_at (L, P, order = order)
+      t2 = time.time ()
+
+      ll.info ('%s: regrid: %.3f s, depth_at: %.3f s' % (method, t1 - t0, t2 - t1))
+      self.assertEqual (d.shape, (lat.size, lon.size))
+      np.testing.assert_allclose (d, z, atol = 1e-6)
+
+  def test_curvilinear (self):
+    ll.info ('testing regrid on curvilinear grid')
+
+    L, P = np.meshgrid (np.linspace (-20, 20, 50), np.linspace (70, 85, 40))
+    L = L + 5 * np.sin (np.radians (P * 10))
+
+    d = self.i.regrid (L, P)
+    self.assertEqual (d.shape, L.shape)
+    np.testing.assert_array_equal (d, self.i.depth_at (L, P, order = 1))
+
+  def test_mean (self):
+    ll.info ('testing regrid mean against binning of all grid cells')
+
+    lon = np.arange (0, 20, 2.)
+    lat = np.arange (84, 80, -1.)
+
+    t0 = time.time ()
+    m  = self.i.regrid (lon, lat, method = 'mean')
+    ll.info ('mean: %.3f s' % (time.time () - t0))
+    self.assertEqual (m.shape, (lat.size, lon.size))
+
+    # cell at lon = 10, lat = 82
+    X, Y = np.meshgrid (self.i.x[5000:7000], self.i.y[3000:5000])
+    L, P = self.i.xy_to_lonlat (X, Y)
+    z = np.asarray (self.i.z[3000:5000, 5000:7000], dtype = np.float64)
+
+    k = (L >= 9) & (L < 11) & (P >= 81.5) & (P < 82.5)
+    a = 1 / self.i.point_scale (P[k])**2
+    self.assertAlmostEqual (m[2, 5], np.sum (z[k] * a) / np.sum (a), places = 6)
+
+    # curvilinear mean is close to the rectilinear mean away from the edges,
+    # where the cells are shaped differently
+    L, P = np.meshgrid (lon, lat)
+    c = self.i.regrid (L, P, method = 'mean')
+    self.assertEqual (c.shape, L.shape)
+    self.assertLess (np.mean (np.abs (c - m)[1:-1, 1:-1]), 0.05 * np.std (m))
+
+  def test_invalid (self):
+    with self.assertRaises (ValueError):
+      self.i.regrid ([0, 1], [80, 81], method = 'spline')
+
+    with self.assertRaises (ValueError):
+      self.i.regrid (np.zeros ((2, 2)), np.zeros (3))
@@ -0,0 +1,103 @@
+# encoding: utf-8
+import common
+import logging as ll
+import unittest as ut
+
+from ibcao  import *
+
+try:
+  from ibcao.sampler import Sampler
+except ImportError:
+  # ibcao.py imported on its own (runtests.sh)
+  from sampler import Sampler
+
+import time
+
+class IbcaoSamplerTest (ut.TestCase):
+  def setUp (self):
+    self.i = IBCAO ()
+
+  def tearDown (self):
+    self.i.close ()
+    del self.i
+
+  def get_xy (self, n = 200000):
+    x = np.random.uniform (-self.i.extent, self.i.extent, n)
+    y = np.random.uniform (-self.i.extent, self.i.extent, n)
+    return (x, y)
+
+  def test_threads (self):
+    ll.info ('testing threaded map_depth')
+
+    x, y = self.get_xy ()
+
+    t0 = time.time ()
+    z  = self.i.map_depth (x, y)
+    t1 = time.time ()
+    ll.info ('workers: 1, %.3f s (including coefficients)' % (t1 - t0))
+
+    for w in [1, 2, 4, 8]:
+      with Sampler (self.i, workers = w) as s:
+        t0 = time.time ()
+        d  = s.map_depth (x, y)
+        t1 = time.time ()
+
+      ll.info ('workers: %d, %.3f s' % (w, t1 - t0))
+      np.testing.assert_array_equal (z, d)
+
+    np.testing.assert_array_equal (z, self.i.map_depth (x, y, workers = 2))
+
+  def test_interp_threads (self):
+    ll.info ('testing threaded interp_depth')
+
+    x, y = self.get_xy (20000)
+
+    z = self.i.interp_depth (x, y)
+    d = self.i.interp_depth (x, y, workers = 4)
+
+    np.testing.assert_array_equal (z, d)
+
+  def test_field_threads (self):
+    ll.info ('testing threaded map_field')
+
+    s = self.i.subset (x = (-2e5, 2e5), y = (-2e5, 2e5))
+    x = np.random.uniform (-2e5, 2e5, 20000)
+    y = np.random.uniform (-2e5, 2e5, 20000)
+
+    z = s.map_field (x, y, 'slope')
+    d = s.map_field (x, y, 'slope', workers = 4)
+
+    np.testing.assert_array_equal (z, d)
+
+  def test_processes (self):
+    ll.info ('testing map_depth in processes')
+
+    x, y = self.get_xy (20000)
+
+    z = self.i.map_depth (x, y, window = True)
+
+    with Sampler (self.i, workers = 2, processes = True) as s:
+      # windows depend on the points in each chunk
+      d = s.map_depth (x, y, window = True)
+      np.testing.assert_allclose (z, d, atol = 1e-6)
+
+      lon, lat = self.i.xy_to_lonlat (x, y)
+      d = s.depth_at (lon, lat, window = True)
+      np.testing.assert_allclose (z, d, atol = 1e-6)
+
+  def test_subset_processes (self):
+    ll.info ('testing process sampler on a subset')
+
+    f = self.i.subset (x = (-2e5, 2e5), y = (-2e5, 2e5))
+    x = np.random.uniform (-3e5, 3e5, 20000)
+    y = np.random.uniform (-3e5, 3e5, 20000)
+
+    z = f.map_depth (x, y, order = 1)
+    r = f.map_field (x, y, f.roughness ())
+
+    with Sampler (f, workers = 2, processes = True) as s:
+      # outside the window is nan
+      np.testing.assert_array_equal (s.map_depth (x, y, order = 1), z)
+      np.testing.assert_array_equal (s.map_field (x, y, f.roughness ()), r)
+
+    self.assertTrue (np.isnan (z).any ())
@@ -0,0 +1,89 @@
+# encoding: utf-8
+import common
+import logging as ll
+import unittest as ut
+
+from ibcao  import *
+
+try:
+  from ibcao.sampler import Sampler
+except ImportError:
+  # ibcao.py imported on its own (runtests.sh)
+  from sampler import Sampler
+
+import os
+import os.path
+import subprocess
+import sys
+
+class IbcaoSharedTest (ut.TestCase):
+  def setUp (self):
+    self.i = IBCAO ()
+
+  def tearDown (self):
+    self.i.close ()
+    del self.i
+
+  def get_xy (self, n = 1000):
+    x = np.random.uniform (-2.8e6, 2.8e6, n)
+    y = np.random.uniform (-2.8e6, 2.8e6, n)
+    return (x, y)
+
+  def test_share (self):
+    ll.info ('testing depth from shared memory')
+
+    x, y = self.get_xy ()
+    d = self.i.map_depth (x, y)
+
+    name = self.i.share ()
+    self.assertEqual (name, self.i.shared_name)
+    self.assertEqual (name, self.i.share ())
+
+    self.assertEqual (self.i.z.dtype, np.float32)
+    self.assertIs (self.i.coefficients (3), self.i._shared['spline3'])
+
+    np.testing.assert_array_equal (d, self.i.map_depth (x, y))
+
+  def test_attach (self):
+    ll.info ('testing attaching to shared memory from another process')
+
+    name = self.i.share (orders = (3,))
+
+    code = """
+import numpy as np
+from ibcao import IBCAO
+j = IBCAO.attach ('%s')
+assert j.coefficients (3) is j._shared['spline3']
+print ('depth:%%r' %% float (j.map_depth (np.array ([1e5]), np.array ([2e5]))[0]))
+j.close ()
+""" % name
+
+    cwd = os.path.join (common.TESTDIR, '..', '..')
+    out = subprocess.check_output ([sys.executable, '-c', code], cwd = cwd)
+    out = [l for l in out.decode ().split ('\n') if l.startswith ('depth:')]
+
+    d = self.i.map_depth (np.array ([1e5]), np.array ([2e5]))[0]
+    self.assertEqual (float (out[-1][len('depth:'):]), d)
+
+  def test_close (self):
+    ll.info ('testing that close removes the shared memory')
+    from multiprocessing import shared_memory
+
+    name = self.i.share ()
+    self.i.close ()
+
+    self.assertIsNone (self.i.shared_name)
+    with self.assertRaises (FileNotFoundError):
+      shared_memory.SharedMemory (name = name)
+
+    self.i = IBCAO ()
+
+  def test_sampler (self):
+    ll.info ('testing process sampler with shared memory')
+
+    x, y = self.get_xy (10000)
+    d = self.i.map_depth (x, y)
+    self.i.share ()
+
+    with Sampler (self.i, workers = 2, processes = True) as s:
+      np.testing.assert_array_equal (d, s.map_depth (x, y))
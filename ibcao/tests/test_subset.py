@@ -0,0 +1,132 @@
+# encoding: utf-8
+import common
+from common import outdir, TRAVIS
+import logging as ll
+import unittest as ut
+
+from ibcao  import *
+
+import os
+import os.path
+import time
+
+class IbcaoSubsetTest (ut.TestCase):
+  def setUp (self):
+    self.i = IBCAO ()
+
+  def tearDown (self):
+    self.i.close ()
+    del self.i
+
+  def get_lonlat (self, n = 5000):
+    lon = np.random.uniform (-15, 10, n)
+    lat = np.random.uniform (77, 81, n)
+    return (lon, lat)
+
+  def test_window (self):
+    ll.info ('testing subset window')
+
+    f = self.i.subset (lon = (-20, 15), lat = (76, 82))
+    r0, r1, c0, c1 = f._window
+
+    self.assertEqual (f.z.shape, (r1 - r0, c1 - c0))
+    self.assertEqual (f.dim, (c1 - c0, r1 - r0))
+    np.testing.assert_array_equal (f.z, self.i.z[r0:r1, c0:c1])
+    np.testing.assert_array_equal (f.x, self.i.x[c0:c1])
+    np.testing.assert_array_equal (f.y, self.i.y[r0:r1])
+    self.assertEqual (f.xlim, (f.x[0], f.x[-1]))
+    self.assertEqual (f.ylim, (f.y[0], f.y[-1]))
+
+    # the box is inside the window
+    lon, lat = self.get_lonlat ()
+    x, y = self.i.lonlat_to_xy (lon, lat)
+    self.assertTrue (np.all ((x >= f.xlim[0]) & (x <= f.xlim[1])))
+    self.assertTrue (np.all ((y >= f.ylim[0]) & (y <= f.ylim[1])))
+
+    # ups box and subset of subset
+    g = f.subset (x = (f.xlim[0] + 1e5, f.xlim[0] + 2e5), y = (f.ylim[0], f.ylim[0] + 1e5))
+    self.assertIs (g._parent, self.i)
+    self.assertEqual (g.xlim, (f.xlim[0] + 1e5, f.xlim[0] + 2e5))
+
+    # across the pole and antimeridian
+    p = self.i.subset (lon = (170, -170), lat = (85, 90))
+    self.assertTrue (p.xlim[0] < 0 < p.xlim[1])
+
+    with self.assertRaises (ValueError):
+      self.i.subset (x = (1e7, 2e7), y = (1e7, 2e7))
+
+  def test_depth (self):
+    ll.info ('testing depth on subset against full grid')
+
+    f = self.i.subset (lon = (-20, 15), lat = (76, 82))
+    lon, lat = self.get_lonlat ()
+    x, y = self.i.lonlat_to_xy (lon, lat)
+
+    for order in (0, 1, 3):
+      t0 = time.time ()
+      d  = f.map_depth (x, y, order = order)
+      t1 = time.time ()
+      ll.info ('order %d: map_depth on subset: %.3f s' % (order, t1 - t0))
+
+      np.testing.assert_allclose (d, self.i.map_depth (x, y, order = order, window = True), atol = 1e-3)
+
+      # coefficients of the subset are padded into the grid
+      pt, pb, pl, pr = f._padding (f._margin + order) if order > 1 else (0, 0, 0, 0)
+      self.assertEqual (f.coefficients (order).shape, (f.z.shape[0] + pt + pb, f.z.shape[1] + pl + pr))
+
+    np.testing.assert_allclose (f.interp_depth (x[:100], y[:100]),
+                                self.i.interp_depth (x[:100], y[:100]))
+    np.testing.assert_allclose (f.depth_at (lon, lat), f.map_depth (x, y))
+
+    # outside the window
+    self.assertTrue (np.isnan (f.map_depth (np.array ([0.]), np.array ([0.])))[0])
+
+    # overview of the window
+    xo, yo, zo = f.overview (2)
+    self.assertEqual (zo.shape, ((f.z.shape[0] + 3) // 4, (f.z.shape[1] + 3) // 4))
+    self.assertAlmostEqual (xo[0], f.x[0] + 750.)
+
+    d = f.map_depth (xo[10:20], yo[[7] * 10], order = 1, level = 2)
+    np.testing.assert_allclose (d, zo[7, 10:20])
+
+    # closing the view keeps the map open
+    f.close ()
+    self.assertEqual (f.coefficients (3).shape[0], f.z.shape[0] + 2 * (f._margin + 3))
+    self.i.map_depth (x, y, order = 1)
+
+  def test_edge (self):
+    ll.info ('testing depth at the edge of a subset against full grid')
+
+    f = self.i.subset (lon = (-20, 15), lat = (76, 82))
+    n = 200
+
+    # along the edges of the window, and a few cells inside
+    for d in (0., .3, 2., 10.):
+      e = d * f.resolution
+      x = np.concatenate ((np.linspace (f.xlim[0], f.xlim[1], n), np.full (n, f.xlim[0] + e),
+                           np.full (n, f.xlim[1] - e), np.linspace (f.xlim[0], f.xlim[1], n)))
+      y = np.concatenate ((np.full (n, f.ylim[0] + e), np.linspace (f.ylim[0], f.ylim[1], n),
+                           np.linspace (f.ylim[0], f.ylim[1], n), np.full (n, f.ylim[1] - e)))
+
+      z = self.i.map_depth (x, y)
+      np.testing.assert_allclose (f.map_depth (x, y), z, atol = 1e-8)
+      np.testing.assert_allclose (f.map_depth (x, y, window = True), z, atol = 1e-8)
+      np.testing.assert_allclose (f.interp_depth (x, y), self.i.interp_depth (x, y), atol = 1e-8)
+
+    # just outside
+    x = np.array ([f.xlim[0] - 10., f.xlim[1] + 10., 0.])
+    y = np.array ([f.ylim[0] + 1e3, f.ylim[0] + 1e3, f.ylim[1] + 10.])
+    self.assertTrue (np.isnan (f.map_depth (x, y)).all ())
+    self.assertTrue (np.isnan (f.map_depth (x, y, window = True)).all ())
+
+  def test_template (self):
+    ll.info ('testing template on subset')
+    import matplotlib.pyplot as plt
+
+    if TRAVIS:
+      return
+
+    f = self.i.subset (lon = (-20, 15), lat = (76, 82))
+    fig = f.template ()
+    fig.savefig (os.path.join (outdir, 'subset_template.png'))
+    plt.close (fig)
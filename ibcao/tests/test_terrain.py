@@ -0,0 +1,152 @@
+# encoding: utf-8
+import common
+from common import outdir
+import logging as ll
+import unittest as ut
+
+from ibcao  import *
+
+import os
+import os.path
+
+class IbcaoTerrainTest (ut.TestCase):
+  def setUp (self):
+    self.i = IBCAO ()
+    self.s = self.i.subset (x = (-2e5, 2e5), y = (-5e5, 1e5))
+
+  def tearDown (self):
+    self.i.close ()
+    del self.i
+
+  def get_z (self, m):
+    # z of the subset with `m` cells of the grid around it
+    r0, r1, c0, c1 = self.s._window
+    return np.asarray (self.i.z[r0 - m:r1 + m, c0 - m:c1 + m], dtype = np.float64)
+
+  def get_gradient (self):
+    s = self.s
+    gy, gx = np.gradient (self.get_z (1), s.resolution)
+    gy, gx = gy[1:-1, 1:-1], gx[1:-1, 1:-1]
+
+    X, Y = np.meshgrid (s.x, s.y)
+    k = s.point_scale (s.xy_to_lonlat (X, Y)[1])
+
+    return (X, Y, k * gx, k * gy)
+
+  def test_slope (self):
+    ll.info ('testing slope against np.gradient')
+
+    _, _, gx, gy = self.get_gradient ()
+    d = self.s.slope ()
+
+    self.assertEqual (d.dtype, np.float32)
+    np.testing.assert_allclose (d, np.degrees (np.arctan (np.hypot (gx, gy))), atol = 1e-4)
+
+    # bands join without seams, and subsets agree with the full grid up to
+    # their edges
+    self.i._chunk = 2048
+    r0, r1, c0, c1 = self.s._window
+    f = self.i.slope ()
+    np.testing.assert_array_equal (f[r0:r1, c0:c1], d)
+
+  def test_aspect (self):
+    ll.info ('testing aspect against the bearing of the downhill direction')
+
+    X, Y, gx, gy = self.get_gradient ()
+    a = self.s.aspect ()
+
+    rng = np.random.default_rng (1)
+    r = rng.integers (0, a.shape[0], 200)
+    c = rng.integers (0, a.shape[1], 200)
+
+    # bearing of a small step downhill on the map
+    g  = np.hypot (gx[r, c], gy[r, c])
+    x0 = X[r, c]
+    y0 = Y[r, c]
+    lon0, lat0 = self.s.xy_to_lonlat (x0, y0)
+    lon1, lat1 = self.s.xy_to_lonlat (x0 - gx[r, c] / g, y0 - gy[r, c] / g)
+    b, _, _ = self.s.geod.inv (lon0, lat0, lon1, lat1)
+
+    e = (a[r, c] - b) % 360.
+    np.testing.assert_allclose (np.minimum (e, 360. - e), 0, atol = 1e-2)
+
+  def test_roughness (self):
+    ll.info ('testing roughness')
+    from scipy.ndimage import maximum_filter, minimum_filter
+
+    for w in (3, 7):
+      m = w // 2
+      z = self.get_z (m).astype (np.float32)
+      np.testing.assert_array_equal (self.s.roughness (w),
+          (maximum_filter (z, w) - minimum_filter (z, w))[m:-m, m:-m])
+
+    self.assertIs (self.s.roughness (), self.s.roughness (3))
+
+    with self.assertRaises (ValueError):
+      self.s.roughness (4)
+
+  def test_curvature (self):
+    ll.info ('testing curvature')
+
+    s = self.s
+    z = self.get_z (1)
+    l = (z[1:-1, 2:] + z[1:-1, :-2] + z[2:, 1:-1] + z[:-2, 1:-1] - 4 * z[1:-1, 1:-1]) / s.resolution**2
+
+    X, Y = np.meshgrid (s.x, s.y)
+    k = s.point_scale (s.xy_to_lonlat (X, Y)[1])
+
+    d = s.curvature ()
+    self.assertEqual (d.dtype, np.float32)
+    np.testing.assert_allclose (d, l * k**2, rtol = 1e-4, atol = 1e-6 * np.abs (l).max ())
+
+    # at the corner of the grid the differences are one-sided, the same as
+    # for a larger subset
+    a = self.i.subset (x = (-self.i.extent, -self.i.extent + 1e5), y = (-self.i.extent, -self.i.extent + 1e5))
+    b = self.i.subset (x = (-self.i.extent, -self.i.extent + 2e5), y = (-self.i.extent, -self.i.extent + 2e5))
+    ny, nx = a.z.shape
+    for f in ('curvature', 'slope'):
+      np.testing.assert_array_equal (getattr (a, f) (), getattr (b, f) ()[:ny, :nx])
+
+  def test_map_field (self):
+    ll.info ('testing sampling of fields')
+
+    s = self.s
+    d = s.slope ()
+    x = s.x[[3, 10, 42]]
+    y = s.y[[7, 11, 5]]
+
+    np.testing.assert_allclose (s.map_field (x, y, 'slope'), d[[7, 11, 5], [3, 10, 42]])
+    np.testing.assert_allclose (s.map_field (x, y, 'aspect'), s.aspect ()[[7, 11, 5], [3, 10, 42]])
+    np.testing.assert_allclose (s.map_field (x, y, 'curvature'), s.curvature ()[[7, 11, 5], [3, 10, 42]])
+    np.testing.assert_allclose (s.map_field (x, y, s.roughness (5), order = 0),
+                                s.roughness (5)[[7, 11, 5], [3, 10, 42]])
+
+    # the same kernels as map_depth
+    xx = np.linspace (s.xlim[0] - 1e3, s.xlim[1], 1000)
+    yy = np.linspace (s.ylim[0], s.ylim[1] + 1e3, 1000)
+    for order in (0, 1):
+      np.testing.assert_array_equal (s.map_field (xx, yy, d, order),
+                                     s.map_field (xx, yy, d, order, chunk_size = 100))
+      np.testing.assert_allclose (s.map_field (xx, yy, s.z, order), s.map_depth (xx, yy, order), equal_nan = True)
+
+    self.assertTrue (np.isnan (s.map_field (1e6, 1e6, 'slope')))
+
+    with self.assertRaises (ValueError):
+      s.map_field (x, y, 'depth')
+
+    with self.assertRaises (ValueError):
+      s.map_field (x, y, 'slope', order = 3)
+
+  def test_persist (self):
+    ll.info ('testing persisted slope')
+
+    i = IBCAO (persist = True, cache_dir = outdir)
+    s = i.subset (x = (-1e5, 1e5), y = (-1e5, 1e5))
+    d = s.slope ()
+
+    j = IBCAO (cache_dir = outdir).subset (x = (-1e5, 1e5), y = (-1e5, 1e5))
+    self.assertIsInstance (j.slope (), np.memmap)
+    np.testing.assert_array_equal (j.slope (), d)
+
+    i.close ()
+    os.remove (s._sidecar ('slope'))
@@ -0,0 +1,68 @@
+# encoding: utf-8
+import common
+from common import outdir
+import logging as ll
+import unittest as ut
+
+from ibcao  import *
+
+try:
+  from ibcao.tiled import TiledGrid
+except ImportError:
+  # ibcao.py imported on its own (runtests.sh)
+  from tiled import TiledGrid
+
+import os
+import os.path
+import shutil
+import subprocess
+import sys
+
+class IbcaoTiledTest (ut.TestCase):
+  def setUp (self):
+    self.i = IBCAO (cache_dir = outdir)
+
+  def tearDown (self):
+    self.i.close ()
+    del self.i
+
+    path = os.path.join (outdir, 'IBCAO_V3_500m_RR.tiles')
+    if os.path.exists (path):
+      shutil.rmtree (path)
+
+  def check_tiles (self, g):
+    z = self.i.z
+
+    np.testing.assert_array_equal (g.read (1000, 1300, 11500, 11700), z[1000:1300, 11500:11700])
+    np.testing.assert_array_equal (g[5:600:7, 100:105], z[5:600:7, 100:105])
+    self.assertEqual (g.read (0, 10, 0, 10).dtype, np.float32)
+    self.assertTrue (g.read (0, 10, 0, 10).dtype.isnative)
+
+  def test_convert (self):
+    ll.info ('testing conversion to tiles')
+
+    for compress in [False, True]:
+      g = self.i.convert (tile = 512, compress = compress)
+      self.check_tiles (g)
+
+      # picked up by new instances
+      i = IBCAO (cache_dir = outdir)
+      self.assertIsNotNone (i._tiles)
+      self.assertEqual (i._tiles.compressed, compress)
+
+      x = np.random.uniform (3e5, 4e5, 100)
+      y = np.random.uniform (-1e6, -9e5, 100)
+
+      np.testing.assert_array_equal (i.map_depth (x, y, window = True), self.i.map_depth (x, y, window = True))
+      np.testing.assert_array_equal (i.interp_depth (x, y), self.i.interp_depth (x, y))
+
+  def test_command (self):
+    ll.info ('testing conversion command')
+
+    cwd = os.path.join (common.TESTDIR, '..', '..')
+    subprocess.check_call ([sys.executable, '-m', 'ibcao.tiled', self.i.ibcao_grid,
+                            '--cache-dir', outdir, '--tile', '1024'], cwd = cwd)
+
+    g = TiledGrid (os.path.join (outdir, 'IBCAO_V3_500m_RR.tiles'))
+    self.assertEqual (g.tile, 1024)
+    self.check_tiles (g)
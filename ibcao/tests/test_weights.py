@@ -0,0 +1,87 @@
+# encoding: utf-8
+import common
+from common import outdir
+import logging as ll
+import unittest as ut
+
+from ibcao  import *
+
+try:
+  from ibcao.weights import Weights
+except ImportError:
+  # ibcao.py imported on its own (runtests.sh)
+  from weights import Weights
+
+import os
+import os.path
+import time
+
+class IbcaoWeightsTest (ut.TestCase):
+  def setUp (self):
+    self.i = IBCAO ()
+
+  def tearDown (self):
+    self.i.close ()
+    del self.i
+
+  def test_against_regrid (self):
+    ll.info ('testing weights against regrid')
+
+    lon = np.arange (-180, 180, .5)
+    lat = np.arange (66, 90, .1)
+    L, P = np.meshgrid (lon, lat)
+    L = L + 3 * np.sin (np.radians (P * 10))
+
+    for method in ('nearest', 'bilinear'):
+      for tlon, tlat in ((lon, lat), (L, P)):
+        t0 = time.time ()
+        w  = Weights.build (self.i, tlon, tlat, method)
+        t1 = time.time ()
+        d  = w.apply (self.i.z)
+        t2 = time.time ()
+
+        ll.info ('%s: build: %.3f s, apply: %.3f s' % (method, t1 - t0, t2 - t1))
+        np.testing.assert_allclose (d, self.i.regrid (tlon, tlat, method), atol = 1e-6)
+
+  def test_mean (self):
+    ll.info ('testing mean weights against regrid')
+
+    lon = np.arange (0, 20, 2.)
+    lat = np.arange (84, 80, -1.)
+
+    w = Weights.build (self.i, lon, lat, 'mean')
+    np.testing.assert_allclose (w.apply (self.i.z), self.i.regrid (lon, lat, 'mean'))
+
+    # any field on the grid
+    f = np.ones (self.i.z.shape, dtype = np.float32)
+    np.testing.assert_allclose (w.apply (f), 1.)
+
+  def test_outside (self):
+    w = Weights.build (self.i, np.array ([0., 10.]), np.array ([40., 80.]), 'bilinear')
+    d = w.apply (self.i.z)
+
+    self.assertTrue (np.all (np.isnan (d[0])))
+    self.assertFalse (np.any (np.isnan (d[1])))
+
+  def test_save (self):
+    ll.info ('testing saving and loading weights')
+
+    w = Weights.build (self.i, np.arange (-180, 180, 5.), np.arange (70, 90, 1.))
+    f = os.path.join (outdir, 'weights.npz')
+    w.save (f)
+
+    l = Weights.load (f)
+    self.assertEqual (l.shape, w.shape)
+    self.assertEqual (l.source_shape, w.source_shape)
+    self.assertEqual (l.method, w.method)
+    np.testing.assert_array_equal (l.apply (self.i.z), w.apply (self.i.z))
+
+    os.remove (f)
+
+  def test_invalid (self):
+    with self.assertRaises (ValueError):
+      Weights.build (self.i, [0.], [80.], 'cubic')
+
+    w = Weights.build (self.i, [0.], [80.])
+    with self.assertRaises (ValueError):
+      w.apply (np.zeros ((10, 10)))
@@ -0,0 +1,137 @@
+# encoding: utf-8
+import common
+import logging as ll
+import unittest as ut
+
+from ibcao  import *
+
+import time
+
+class IbcaoZonalTest (ut.TestCase):
+  def setUp (self):
+    self.i = IBCAO ()
+
+  def tearDown (self):
+    self.i.close ()
+    del self.i
+
+  def get_polygons (self, n = 50, rmax = 1e5):
+    rng = np.random.default_rng (1)
+    ps = []
+    for _ in range (n):
+      cx, cy = rng.uniform (-2.5e6, 2.5e6, 2)
+      t = np.sort (rng.uniform (0, 2 * np.pi, 12))
+      r = rng.uniform (5e3, rmax) * rng.uniform (.3, 1, 12)
+      ps.append (np.stack ([ cx + r * np.cos (t), cy + r * np.sin (t) ], axis = -1))
+
+    return ps
+
+  def brute (self, rings, bins):
+    from matplotlib.path import Path
+
+    v = np.concatenate (rings)
+    x, y = self.i.x, self.i.y
+    c0, c1 = np.searchsorted (x, [v[:, 0].min (), v[:, 0].max ()])
+    r0, r1 = np.searchsorted (y, [v[:, 1].min (), v[:, 1].max ()])
+
+    X, Y = np.meshgrid (x[c0:c1], y[r0:r1])
+    xy = np.stack ([ X.ravel (), Y.ravel () ], axis = -1)
+    m  = np.zeros (X.size, dtype = bool)
+    for r in rings:
+      m ^= Path (r).contains_points (xy)
+    m = m.reshape (X.shape)
+
+    z = np.asarray (self.i.z[r0:r1, c0:c1], dtype = np.float64)[m]
+    a = self.i.resolution**2 / self.i.point_scale (self.i.xy_to_lonlat (X[m], Y[m])[1])**2
+
+    return { 'count' : m.sum (), 'min' : z.min (), 'max' : z.max (),
+             'mean' : np.dot (z, a) / a.sum (), 'area' : a.sum (),
+             'hist' : np.histogram (z, bins, weights = a)[0] }
+
+  def test_against_brute_force (self):
+    ll.info ('testing zonal stats against contains_points')
+
+    ps   = self.get_polygons ()
+    bins = [ -5000, -3000, -2000, -1000, 0 ]
+
+    t0 = time.time ()
+    s  = self.i.zonal_stats (ps, bins = bins, lonlat = False)
+    ll.info ('zonal_stats: %d polygons, %.3f s' % (len(ps), time.time () - t0))
+
+    self.assertEqual (sorted (s), sorted (self.i._zonal_stats))
+
+    for k, p in enumerate (ps[:10]):
+      b = self.brute ([ p ], bins)
+      self.assertEqual (s['count'][k], b['count'])
+      for st in [ 'min', 'max', 'mean', 'area' ]:
+        np.testing.assert_allclose (s[st][k], b[st], rtol = 1e-9)
+      np.testing.assert_allclose (s['hist'][k], b['hist'], rtol = 1e-9)
+
+    # threads
+    t = self.i.zonal_stats (ps, bins = bins, lonlat = False, workers = 4)
+    for st in s:
+      np.testing.assert_array_equal (s[st], t[st])
+
+  def test_rings (self):
+    ll.info ('testing polygons with holes')
+
+    # edges between the cell centers
+    o = np.array ([ [ -3e5, -3e5 ], [ 3e5, -3e5 ], [ 3e5, 3e5 ], [ -3e5, 3e5 ] ]) + 123.
+    h = o[::-1] / 3.
+    s = self.i.zonal_stats ([ [ o, h ], o, h ], lonlat = False)
+    b = self.brute ([ o, h ], [ -1, 0 ])
+
+    self.assertEqual (s['count'][0], b['count'])
+    self.assertEqual (s['count'][0], s['count'][1] - s['count'][2])
+    np.testing.assert_allclose (s['area'][0], s['area'][1] - s['area'][2])
+
+    try:
+      from shapely.geometry import Polygon
+    except ImportError:
+      return
+
+    t = self.i.zonal_stats ([ Polygon (o, [ h ]) ], lonlat = False)
+    for st in s:
+      np.testing.assert_array_equal (s[st][:1], t[st])
+
+  def test_lonlat (self):
+    ll.info ('testing zonal stats on lon/lat polygons')
+
+    p = np.array ([ [ 0, 80 ], [ 20, 80 ], [ 20, 82 ], [ 0, 82 ] ], dtype = np.float64)
+    s = self.i.zonal_stats ([ p ], bins = [ -6000, 0 ])
+    x, y = self.i.lonlat_to_xy (p[:, 0], p[:, 1])
+    t = self.i.zonal_stats ([ np.stack ([ x, y ], axis = -1) ], bins = [ -6000, 0 ], lonlat = False)
+
+    for st in s:
+      np.testing.assert_array_equal (s[st], t[st])
+
+    # all cells in the single bin
+    np.testing.assert_allclose (s['hist'][:, 0], s['area'])
+    self.assertGreater (s['count'][0], 0)
+
+  def test_subset (self):
+    ll.info ('testing zonal stats on a subset')
+
+    ps = [ p for p in self.get_polygons (20) if np.abs (p).max () < 1.8e6 ]
+    s  = self.i.subset (x = (-2e6, 2e6), y = (-2e6, 2e6))
+
+    a = self.i.zonal_stats (ps, lonlat = False)
+    b = s.zonal_stats (ps, lonlat = False)
+    for st in a:
+      np.testing.assert_allclose (a[st], b[st], rtol = 1e-12)
+
+  def test_outside (self):
+    ll.info ('testing polygons outside the grid')
+
+    p = np.array ([ [ 5e6, 5e6 ], [ 6e6, 5e6 ], [ 6e6, 6e6 ] ])
+    s = self.i.zonal_stats ([ p, p[:, ::-1] * -1 ], stats = [ 'count', 'mean', 'area' ], lonlat = False)
+
+    np.testing.assert_array_equal (s['count'], [ 0, 0 ])
+    self.assertTrue (np.isnan (s['mean']).all ())
+    np.testing.assert_array_equal (s['area'], [ 0, 0 ])
+
+    with self.assertRaises (ValueError):
+      self.i.zonal_stats ([ p ], stats = [ 'median' ])
+
+    with self.assertRaises (ValueError):
+      self.i.zonal_stats ([ p ], stats = [ 'hist' ])
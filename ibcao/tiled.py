@@ -0,0 +1,169 @@
+#! /usr/bin/env python
+# encoding: utf-8
+#
+# Tiled cache format for the IBCAO grid
+
+import  os
+import  json
+import  numpy as np
+
+__all__ = [ 'TiledGrid' ]
+
+class TiledGrid:
+  """
+  A 2D grid stored as square tiles of native-endian float32 in a directory,
+  one file per tile, together with a `meta.json` describing the layout.
+
+  Uncompressed tiles are `.npy` files which are memory-mapped, compressed
+  tiles are `.npz` files which are decompressed when read. Reading a region
+  only touches the tiles it overlaps. Tiles are kept in a least recently used
+  cache limited to `cache_size` bytes.
+
+  Use `convert` (or `python -m ibcao.tiled grd-file`) to create the tiles
+  from an IBCAO grid. `IBCAO` uses the tiles automatically for region reads
+  when they are found next to the grid (or in its `cache_dir`).
+
+  Args:
+    path: directory with tiles
+    cache_size: memory budget in bytes for decompressed tiles (default 64 MB)
+  """
+
+  def __init__ (self, path, cache_size = 64 * 1024**2):
+    try:
+      from .ibcao import _LRUCache
+    except ImportError:
+      from ibcao import _LRUCache
+
+    self.path = path
+    with open (os.path.join (path, 'meta.json'), 'r') as fd:
+      meta = json.load (fd)
+
+    self.shape      = tuple (meta['shape'])
+    self.tile       = meta['tile']
+    self.compressed = meta['compressed']
+    self.dtype      = np.dtype (meta['dtype'])
+    self.ndim       = 2
+
+    self._tiles = _LRUCache (cache_size)
+
+  @staticmethod
+  def _name (tr, tc, compressed):
+    return 'tile_%03d_%03d.%s' % (tr, tc, 'npz' if compressed else 'npy')
+
+  @classmethod
+  def convert (cls, z, path, tile = 256, compress = False):
+    """
+    Write the grid `z` as tiles to the directory `path`.
+
+    `z` is read in bands of `tile` rows, so that only one band is kept in
+    memory.
+
+    Args:
+      z: 2D array (e.g. the memory-mapped `IBCAO.z`)
+      path: output directory, created if it does not exist
+      tile: tile size in cells (default 256)
+      compress: compress the tiles (default False)
+
+    Returns:
+      TiledGrid
+    """
+    os.makedirs (path, exist_ok = True)
+    ny, nx = z.shape
+
+    # tiles are incomplete until meta.json is written
+    meta = os.path.join (path, 'meta.json')
+    if os.path.exists (meta):
+      os.remove (meta)
+
+    for f in os.listdir (path):
+      if f.startswith ('tile_'):
+        os.remove (os.path.join (path, f))
+
+    for tr, r0 in enumerate (range (0, ny, tile)):
+      band = np.ascontiguousarray (z[r0:r0 + tile, :], dtype = np.float32)
+
+      for tc, c0 in enumerate (range (0, nx, tile)):
+        t = np.ascontiguousarray (band[:, c0:c0 + tile])
+        fname = os.path.join (path, cls._name (tr, tc, compress))
+
+        if compress:
+          np.savez_compressed (fname, z = t)
+        else:
+          np.save (fname, t)
+
+    # written last, marks the conversion as complete
+    with open (meta, 'w') as fd:
+      json.dump ({ 'shape' : [ ny, nx ], 'tile' : tile, 'compressed' : compress,
+                   'dtype' : np.dtype (np.float32).str }, fd)
+
+    return cls (path)
+
+  def _tile (self, tr, tc):
+    def load ():
+      fname = os.path.join (self.path, self._name (tr, tc, self.compressed))
+      if self.compressed:
+        with np.load (fname) as f:
+          return f['z']
+      else:
+        return np.load (fname, mmap_mode = 'r')
+
+    # memory-mapped tiles do not take up memory until read
+    size = lambda t: t.nbytes if self.compressed else 0
+
+    return self._tiles.get ((tr, tc), load, size)
+
+  def read (self, r0, r1, c0, c1):
+    """
+    Read the region `[r0:r1, c0:c1]` (clipped to the grid).
+    """
+    r0, r1 = max (0, r0), min (self.shape[0], r1)
+    c0, c1 = max (0, c0), min (self.shape[1], c1)
+
+    out = np.empty ((max (0, r1 - r0), max (0, c1 - c0)), dtype = self.dtype)
+    t   = self.tile
+
+    for tr in range (r0 // t, (r1 - 1) // t + 1 if r1 > r0 else 0):
+      for tc in range (c0 // t, (c1 - 1) // t + 1 if c1 > c0 else 0):
+        a = self._tile (tr, tc)
+
+        # overlap in grid indices
+        ar0, ar1 = max (r0, tr * t), min (r1, (tr + 1) * t)
+        ac0, ac1 = max (c0, tc * t), min (c1, (tc + 1) * t)
+
+        out[ar0 - r0:ar1 - r0, ac0 - c0:ac1 - c0] = \
+            a[ar0 - tr * t:ar1 - tr * t, ac0 - tc * t:ac1 - tc * t]
+
+    return out
+
+  def __getitem__ (self, key):
+    """
+    Read a region with a tuple of two slices, e.g. `g[10:20, ::10]`. Steps are
+    applied after reading the region.
+    """
+    if not isinstance (key, tuple) or len(key) != 2 or not all (isinstance (k, slice) for k in key):
+      raise IndexError ("TiledGrid only supports indexing with two slices")
+
+    (r0, r1, rs), (c0, c1, cs) = [ k.indices (n) for k, n in zip (key, self.shape) ]
+    if rs < 0 or cs < 0:
+      raise IndexError ("TiledGrid does not support negative steps")
+
+    return self.read (r0, r1, c0, c1)[::rs, ::cs]
+
+  def __array__ (self, dtype = None, copy = None):
+    a = self.read (0, self.shape[0], 0, self.shape[1])
+    return a if dtype is None else a.astype (dtype)
+
+if __name__ == '__main__':
+  import argparse
+  from .ibcao import IBCAO
+
+  parser = argparse.ArgumentParser (description = 'Convert the IBCAO grid to tiles, used by IBCAO for region reads.')
+  parser.add_argument ('grid', help = 'IBCAO grd file')
+  parser.add_argument ('--cache-dir', default = None, help = 'output directory (default: next to the grid)')
+  parser.add_argument ('--tile', type = int, default = 256, help = 'tile size in cells (default: 256)')
+  parser.add_argument ('--compress', action = 'store_true', help = 'compress tiles')
+  args = parser.parse_args ()
+
+  i = IBCAO (args.grid, cache_dir = args.cache_dir)
+  g = i.convert (tile = args.tile, compress = args.compress)
+  print ("ibcao: wrote tiles to:", g.path)
@@ -0,0 +1,177 @@
+#! /usr/bin/env python
+# encoding: utf-8
+#
+# Precomputed regridding weights for the IBCAO
+
+import  numpy as np
+
+__all__ = [ 'Weights' ]
+
+class Weights:
+  """
+  Sparse weights from the cells of the IBCAO grid to the points of a target
+  grid, as computed by `build`. Once built, regridding a field on the IBCAO
+  grid (`IBCAO.z` or any array of the same shape, e.g. from a newer version
+  of the grid) is a gather of the source cells that are used followed by a
+  single sparse matrix-vector product.
+
+  The weights can be stored with `save` and read back with `load`.
+
+  Args:
+    matrix: sparse matrix (number of target points, number of columns)
+    columns: flat indices into the source grid of the matrix columns
+    shape: shape of the target grid
+    source_shape: shape of the source grid
+    method: method the weights were built with
+
+  >>> i = IBCAO ()
+  >>> w = Weights.build (i, lon, lat, method = 'mean')
+  >>> w.save ('model-grid.npz')
+  >>> d = Weights.load ('model-grid.npz').apply (i.z)
+  """
+
+  methods = ('nearest', 'bilinear', 'mean')
+
+  def __init__ (self, matrix, columns, shape, source_shape, method):
+    self.matrix       = matrix.tocsr ()
+    self.columns      = np.asarray (columns, dtype = np.intp)
+    self.shape        = tuple (int (n) for n in shape)
+    self.source_shape = tuple (int (n) for n in source_shape)
+    self.method       = method
+
+    # target points without any source cells
+    self._empty = np.diff (self.matrix.indptr) == 0
+
+  @classmethod
+  def build (cls, ibcao, target_lon, target_lat, method = 'bilinear'):
+    """
+    Compute the weights from `ibcao` to the target grid, see
+    `IBCAO.regrid` for the target grids and methods. The 'cubic' method of
+    `regrid` is not available since the prefilter of the splines is not
+    local.
+
+    Args:
+      ibcao: `IBCAO` instance
+      target_lon: (1D or 2D array) longitude of target points in degrees
+      target_lat: (1D or 2D array) latitude of target points in degrees
+      method: 'nearest', 'bilinear' (default) or 'mean'.
+
+    Returns:
+      Weights
+    """
+    from scipy.sparse import coo_matrix
+
+    if method not in cls.methods:
+      raise ValueError ("method must be one of: %s" % ', '.join ("'%s'" % m for m in cls.methods))
+
+    lon = np.asarray (target_lon, dtype = np.float64)
+    lat = np.asarray (target_lat, dtype = np.float64)
+
+    if lon.ndim == 1 and lat.ndim == 1:
+      shape = (lat.size, lon.size)
+    elif lon.ndim == 2 and lon.shape == lat.shape:
+      shape = lon.shape
+    else:
+      raise ValueError ("target_lon and target_lat must be 1D, or 2D with the same shape")
+
+    source_shape = ibcao.z.shape
+    rows, cols, vals = [], [], []
+
+    if method == 'mean':
+      if lon.ndim == 1:
+        locate, rho_max = ibcao._locate_rect (lon, lat)
+        bbox = None
+      else:
+        locate, rho_max, bbox = ibcao._locate_curv (lon, lat)
+
+      nx = source_shape[1]
+      for (r0, r1, c0, c1), k, a in ibcao._bin_blocks (locate, rho_max, bbox):
+        m = np.flatnonzero (k.ravel () >= 0)
+        rows.append (k.ravel ()[m])
+        cols.append ((r0 + m // (c1 - c0)) * nx + c0 + m % (c1 - c0))
+        vals.append (a.ravel ()[m])
+
+    else:
+      nx = source_shape[1]
+      for i0, i1, r, c in ibcao._target_blocks (lon, lat):
+        inside = np.flatnonzero ((r >= 0) & (r <= source_shape[0] - 1) &
+                                 (c >= 0) & (c <= nx - 1))
+        r = r[inside]
+        c = c[inside]
+        t = i0 + inside
+
+        if method == 'nearest':
+          rows.append (t)
+          cols.append (ibcao._nearest_index (source_shape, r, c))
+          vals.append (np.ones (t.size))
+
+        else:
+          k, fr, fc = ibcao._bilinear_index (source_shape, r, c)
+          for dk, w in ((0, (1 - fr) * (1 - fc)), (1, (1 - fr) * fc),
+                        (nx, fr * (1 - fc)), (nx + 1, fr * fc)):
+            rows.append (t)
+            cols.append (k + dk)
+            vals.append (w)
+
+    rows = np.concatenate (rows) if rows else np.empty (0, dtype = np.intp)
+    cols = np.concatenate (cols) if cols else np.empty (0, dtype = np.intp)
+    vals = np.concatenate (vals) if vals else np.empty (0)
+
+    # only keep columns for the source cells that are used
+    columns, cols = np.unique (cols, return_inverse = True)
+
+    n = int (np.prod (shape))
+    matrix = coo_matrix ((vals, (rows, cols.ravel ())), shape = (n, columns.size)).tocsr ()
+
+    if method == 'mean':
+      # normalize the areas to the mean
+      s = np.asarray (matrix.sum (axis = 1)).ravel ()
+      s[s == 0] = 1.
+      matrix.data /= np.repeat (s, np.diff (matrix.indptr))
+
+    return cls (matrix, columns, shape, source_shape, method)
+
+  def apply (self, field):
+    """
+    Regrid `field` onto the target grid.
+
+    Nan values in the field are propagated to the target points that use
+    them. Target points without source cells (e.g. outside the grid) are nan.
+
+    Args:
+      field: array with the shape of the source grid, e.g. `IBCAO.z`
+
+    Returns:
+      field on the target grid.
+    """
+    if tuple (field.shape) != self.source_shape:
+      raise ValueError ("field must have the shape of the source grid: %s" % (self.source_shape,))
+
+    v = np.asarray (field).reshape (-1).take (self.columns)
+    d = self.matrix @ v.astype (np.float64)
+    d[self._empty] = np.nan
+
+    return d.reshape (self.shape)
+
+  def save (self, path):
+    """
+    Store the weights in the `.npz` file `path`.
+    """
+    np.savez (path, data = self.matrix.data, indices = self.matrix.indices,
+              indptr = self.matrix.indptr, columns = self.columns,
+              shape = self.shape, source_shape = self.source_shape,
+              method = self.method)
+
+  @classmethod
+  def load (cls, path):
+    """
+    Read weights stored with `save`.
+    """
+    from scipy.sparse import csr_matrix
+
+    with np.load (path) as f:
+      columns = f['columns']
+      matrix  = csr_matrix ((f['data'], f['indices'], f['indptr']),
+                            shape = (int (np.prod (f['shape'])), columns.size))
+
+      return cls (matrix, columns, f['shape'], f['source_shape'], str (f['method']))